@@ -2,39 +2,62 @@
 # This script prepares for hyper-image conversion by renaming files, and saving labels in YOLO format.
 # It also separates the channels of the images and labels for each test set.
 # This script should be run before running 2_make_hyper_image.py.
+# Re-runs are incremental: a build manifest records what each output was built from, and only new or changed
+# frames and labels are processed. Use --clean to delete the derived outputs first, --rebuild to ignore the manifest.
 # Ensure that the config.json file is in the same directory as this script, and that it contains the base_dir key.
 ###################################################################################################################
 
 import os
 import json
 import shutil
+import argparse
 import cv2
 from tqdm import tqdm
 
+from build_manifest import BuildManifest, atomic_imwrite, atomic_write_bytes, file_stamp
+
 # Load configuration
 def load_config():
-    with open('config.json', 'r') as config_file:
+    # Relative to this script, so it also works when run from another directory
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+    with open(config_path, 'r') as config_file:
         return json.load(config_file)
 
 config = load_config()
 BASE_DIR = config.get("base_dir", "")
 
-def clear_subdirectories(directory):
+# Bump when a change to this script alters the files it writes, so the manifest rebuilds them
+LABELS_VERSION = 1
+CHANNELS_VERSION = 1
+
+def clear_subdirectories(directory, keep=()):
     """
-    Delete all subdirectories and their contents in the specified directory.
+    Delete all subdirectories and their contents in the specified directory, except those named in keep.
     """
+    if not os.path.isdir(directory):
+        return
     for item in os.listdir(directory):
         item_path = os.path.join(directory, item)
-        if os.path.isdir(item_path):
+        if os.path.isdir(item_path) and item not in keep:
             shutil.rmtree(item_path)
             print(f"Deleted subdirectory and contents: {item_path}")
 
+def clean_outputs(test_name):
+    """
+    Delete the outputs derived by this script for test_name. The images subdirectory is kept: it holds
+    the source frames moved there by rename_files.
+    """
+    clear_subdirectories(os.path.join(BASE_DIR, test_name), keep=('images',))
+    for i in range(3):
+        channel_dir = os.path.join(BASE_DIR, test_name + '_' + str(i))
+        if os.path.isdir(channel_dir):
+            shutil.rmtree(channel_dir)
+            print(f"Deleted subdirectory and contents: {channel_dir}")
+
 def rename_files(test_name):
     directory = os.path.join(BASE_DIR, test_name)
 
-    # Clear any existing subdirectories in the target directory
-    clear_subdirectories(directory)
-
+    # Frames renamed by a previous run are already in images/; only new ones are left in directory
     new_dir = os.path.join(directory, 'images')
     os.makedirs(new_dir, exist_ok=True)
 
@@ -57,7 +80,7 @@ def rename_files(test_name):
 
     print(f"Files renamed and organized for {test_name}.")
 
-def save_labels(test_name):
+def save_labels(test_name, manifest):
     labels_dir = os.path.join(BASE_DIR, test_name, "labels")
     json_file = os.path.join(BASE_DIR, test_name + '.json')
 
@@ -71,6 +94,14 @@ def save_labels(test_name):
         print(f"JSON file {json_file} not found.")
         return
 
+    # Hashed, since the JSON is often re-exported with identical contents
+    key = f"{test_name}/labels"
+    stamps = manifest.stamps([json_file], use_hash=True)
+    params = {"format": "yolo", "version": LABELS_VERSION}
+    if manifest.is_up_to_date(key, stamps, params):
+        print(f"Labels for {test_name} are up to date.")
+        return
+
     # Create a mapping of file names to image IDs and their dimensions
     annotations_map = {}
     for annotation in data['annotations']:
@@ -79,6 +110,8 @@ def save_labels(test_name):
             annotations_map[image_id] = []
         annotations_map[image_id].append(annotation)
 
+    label_files = []
+    changed = 0
     for image in tqdm(data['images'], desc=f"Saving labels for {test_name}"):
         image_id = image['id']
         img_width = image['width']
@@ -90,23 +123,38 @@ def save_labels(test_name):
         padded_base_name = '_'.join(base_name_parts)
 
         label_file_path = os.path.join(labels_dir, f"{padded_base_name}.txt")
-        with open(label_file_path, 'w') as label_file:
-            if image_id in annotations_map:
-                for annotation in annotations_map[image_id]:
-                    class_id = annotation['category_id']
-                    bbox = annotation['bbox']
-
-                    # Convert bbox to YOLO format
-                    x_center = (bbox[0] + bbox[2] / 2) / img_width
-                    y_center = (bbox[1] + bbox[3] / 2) / img_height
-                    width = bbox[2] / img_width
-                    height = bbox[3] / img_height
-
-                    label_file.write(f"{class_id-1} {x_center} {y_center} {width} {height}\n")
-
-    print(f"Labels saved in YOLO format in {labels_dir} for {test_name}.")
+        lines = []
+        if image_id in annotations_map:
+            for annotation in annotations_map[image_id]:
+                class_id = annotation['category_id']
+                bbox = annotation['bbox']
+
+                # Convert bbox to YOLO format
+                x_center = (bbox[0] + bbox[2] / 2) / img_width
+                y_center = (bbox[1] + bbox[3] / 2) / img_height
+                width = bbox[2] / img_width
+                height = bbox[3] / img_height
+
+                lines.append(f"{class_id-1} {x_center} {y_center} {width} {height}\n")
+
+        # Unchanged label files are left untouched, so their mtimes do not invalidate downstream outputs
+        content = ''.join(lines).encode()
+        if not _same_contents(label_file_path, content):
+            atomic_write_bytes(label_file_path, content)
+            changed += 1
+        label_files.append(label_file_path)
+
+    manifest.record(key, stamps, params, label_files)
+    print(f"Labels saved in YOLO format in {labels_dir} for {test_name} ({changed} changed).")
+
+def _same_contents(path, content):
+    try:
+        with open(path, 'rb') as f:
+            return f.read() == content
+    except FileNotFoundError:
+        return False
 
-def separate_channels(test_name):
+def separate_channels(test_name, manifest):
     directory = os.path.join(BASE_DIR, test_name, 'images')
     new_dirs = [os.path.join(BASE_DIR, test_name + '_' + str(i), 'images') for i in range(3)]
     for new_dir in new_dirs:
@@ -114,21 +162,36 @@ def separate_channels(test_name):
 
     image_files = [f for f in os.listdir(directory) if f.endswith('.jpg')]
 
+    params = {"quality": 95, "version": CHANNELS_VERSION}
+    skipped = 0
+    seen = set()
     for image_file in tqdm(image_files, desc=f"Separating channels for {test_name}"):
         src_image_path = os.path.join(directory, image_file)
+        base_filename = os.path.splitext(image_file)[0]
+        key = f"{test_name}_channels/{base_filename}"
+        seen.add(key)
+        stamps = manifest.stamps([src_image_path])
+        if manifest.is_up_to_date(key, stamps, params):
+            skipped += 1
+            continue
+
         image = cv2.imread(src_image_path)
 
         if image is None:
             print(f"Warning: Failed to load image {src_image_path}. Skipping.")
             continue
 
-        base_filename = os.path.splitext(image_file)[0]
+        save_image_paths = []
         for channel in range(3):
             channel_image = image[:, :, channel]
             save_image_path = os.path.join(new_dirs[channel], f"{base_filename}.jpg")
-            cv2.imwrite(save_image_path, channel_image, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+            atomic_imwrite(save_image_path, channel_image, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+            save_image_paths.append(save_image_path)
+        manifest.record(key, stamps, params, save_image_paths)
 
-    print(f"Channels separated for {test_name}.")
+    # Source frames that are gone: forget them and delete their channel images
+    removed = manifest.prune(f"{test_name}_channels/", seen)
+    print(f"Channels separated for {test_name} ({skipped} up to date, {removed} removed).")
 
 def copy_labels(test_name):
     label_dir = os.path.join(BASE_DIR,test_name, "labels")
@@ -140,20 +203,36 @@ def copy_labels(test_name):
         for label_file in tqdm(os.listdir(label_dir), desc=f"Copying labels to {new_label_dir}"):
             src_path = os.path.join(label_dir, label_file)
             dest_path = os.path.join(new_label_dir, label_file)
-            shutil.copy(src_path, dest_path)
+            # copy2 keeps the mtime, so an unchanged label has the same stamp as its copy
+            if file_stamp(dest_path) != file_stamp(src_path):
+                shutil.copy2(src_path, dest_path)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prepare the sonar datasets for 2_make_hyper_image.py")
+    parser.add_argument("--clean", action="store_true", help="delete the derived labels and channel datasets first")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the build manifest and regenerate every output")
+    args = parser.parse_args()
+
     test_names = ['cfc_channel_test', 'cfc_val', 'cfc_train']
+    manifest = BuildManifest(os.path.join(BASE_DIR, ".manage_files_manifest.json"), BASE_DIR,
+                             rebuild=args.rebuild or args.clean)
+
+    try:
+        for test_name in test_names:
+            if args.clean:
+                print(f"Cleaning outputs for {test_name}...")
+                clean_outputs(test_name)
 
-    for test_name in test_names:
-        print(f"Processing renaming for {test_name}...")
-        rename_files(test_name)
+            print(f"Processing renaming for {test_name}...")
+            rename_files(test_name)
 
-        print(f"Processing label generation for {test_name}...")
-        save_labels(test_name)
+            print(f"Processing label generation for {test_name}...")
+            save_labels(test_name, manifest)
 
-        print(f"Processing channel separation for {test_name}...")
-        separate_channels(test_name)
+            print(f"Processing channel separation for {test_name}...")
+            separate_channels(test_name, manifest)
 
-        print(f"Processing label copying for {test_name}...")
-        copy_labels(test_name)
+            print(f"Processing label copying for {test_name}...")
+            copy_labels(test_name)
+    finally:
+        manifest.save()
@@ -9,11 +9,24 @@ import cv2
 import numpy as np
 import shutil
 import json
+import argparse
+import itertools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 
+from build_manifest import BuildManifest, atomic_imwrite, atomic_np_save, atomic_write_bytes
+
+# Bump when a change to this script alters the bytes it writes, so the manifest rebuilds every output
+OUTPUT_VERSION = 1
+
 # Load configuration
 def load_config():
-    with open('config.json', 'r') as config_file:
+    # Relative to this script, so it also works when imported from another directory
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+    with open(config_path, 'r') as config_file:
         return json.load(config_file)
 
 config = load_config()
@@ -35,10 +48,85 @@ def get_clips(image_dir):
         clips[key].append(image_file)
     return clips
 
+def load_frame(image_path):
+    """
+    Reads one grayscale frame scaled to [0, 1] float32.
+    :param image_path: Path to the image
+    :return: The frame, or None if it could not be read
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        print(f"Warning: Failed to load image {image_path}. Skipping this sequence.")
+        return None
+    return image.astype(np.float32) / 255.0
+
+def clip_mean(frames, total_frames):
+    """
+    Mean frame of a clip, accumulated in order (stops at the first unreadable frame).
+    :param frames: Decoded frames (None for unreadable ones)
+    :param total_frames: Number of frames in the clip
+    :return: The mean frame, or None if the first frame is unreadable
+    """
+    mean_image = None
+    for image in frames:
+        if image is None:
+            break
+        if mean_image is None:
+            mean_image = image / total_frames
+        else:
+            mean_image += image / total_frames
+    return mean_image
+
+def _combine(frames, mode, mean_image=None):
+    """
+    Builds one hyper image from the n frames of a window (n odd, center frame in the middle).
+    """
+    half_n = len(frames) // 2
+    if mode == 'stack':
+        return np.stack(frames, axis=-1)
+    elif mode == 'diff':
+        central_frame = frames[half_n]
+        differences = [(frame - central_frame) / 2 + 0.5 for frame in frames]
+        differences[half_n] = central_frame
+        return np.stack(differences, axis=-1)
+    elif mode == 'mean':
+        differences = [(frame - mean_image) / 2 + 0.5 for frame in frames]
+        differences[half_n] = frames[half_n]
+        return np.stack(differences, axis=-1)
+    else:
+        raise ValueError("Invalid mode. Choose from 'stack', 'diff', 'mean'.")
+
+def _iter_windows(frames, image_paths, variants, mean_image=None):
+    """
+    Slides one rolling buffer of the largest n over the decoded frames and yields
+    ((mode, n), filename, hyper_image) for every variant whose window of the last n frames is full.
+    Windows containing an unreadable frame are skipped.
+    """
+    for mode, n in variants:
+        assert n % 2 == 1, "n must be an odd number."
+    window = deque(maxlen=max(n for _, n in variants))
+    for j, image in enumerate(frames):
+        window.append(image)
+        for mode, n in variants:
+            if len(window) < n:
+                continue
+            frames_n = list(itertools.islice(window, len(window) - n, None))
+            if any(frame is None for frame in frames_n):
+                continue
+            i = j - n // 2  # center of the window that just filled
+            yield (mode, n), image_paths[i].split('/')[-1], _combine(frames_n, mode, mean_image)
+
+def _window_hyper_images(frames, image_paths, mode, n, mean_image=None):
+    return [(filename, hyper_image) for _, filename, hyper_image in _iter_windows(frames, image_paths, [(mode, n)], mean_image)]
+
 def make_hyper_image(image_paths, mode, n):
     """
     Combines multiple frames into a hyper image. Assumes all the images are single-channel grayscale.
 
+    Each frame is decoded exactly once: a rolling buffer holds the n frames of
+    the current window, and in 'mean' mode the decoded clip is kept for the
+    hyper images instead of being read a second time.
+
     Parameters:
         image_paths (list): Paths of all the images in the sequence.
         mode (str): Mode of operation ('stack', 'diff', 'mean').
@@ -48,56 +136,54 @@ def make_hyper_image(image_paths, mode, n):
         List of hyper images as tuples (filename, hyper_image).
     """
     assert n % 2 == 1, "n must be an odd number."
-    half_n = n // 2  # Frames on each side of the center frame
-
-    total_frames = len(image_paths)
-
-    hyper_images = []
     mean_image = None
     if mode == 'mean':
-        mean_image = None
-        for image_path in image_paths:
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).astype(np.float32) / 255.0
-            if image is None:
-                print(f"Warning: Failed to load image {image_path}. Skipping this sequence.")
-                break
-            if mean_image is None:
-                mean_image = image / total_frames
-            else:
-                mean_image += image / total_frames
-
-    for i in range(half_n, total_frames - half_n):
-        frames = []
-        for j in range(i - half_n, i + half_n + 1):
-            image_path = image_paths[j]
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).astype(np.float32) / 255.0
-
-            if image is None:
-                print(f"Warning: Failed to load image {image_path}. Skipping this sequence.")
-                break
-
-            frames.append(image)
-
-        if len(frames) != n:
-            continue
-
-        if mode == 'stack':
-            hyper_image = np.stack(frames, axis=-1)
-        elif mode == 'diff':
-            central_frame = frames[half_n]
-            differences = [(frame - central_frame) / 2 + 0.5 for frame in frames]
-            differences[half_n] = central_frame
-            hyper_image = np.stack(differences, axis=-1)
-        elif mode == 'mean':
-            differences = [(frame - mean_image) / 2 + 0.5 for frame in frames]
-            differences[half_n] = frames[half_n]
-            hyper_image = np.stack(differences, axis=-1)
-        else:
-            raise ValueError("Invalid mode. Choose from 'stack', 'diff', 'mean'.")
+        frames = [load_frame(image_path) for image_path in image_paths]
+        mean_image = clip_mean(frames, len(image_paths))
+    else:
+        frames = (load_frame(image_path) for image_path in image_paths)
+    return _window_hyper_images(frames, image_paths, mode, n, mean_image)
+
+def make_hyper_images(image_paths, variants):
+    """
+    Builds several kinds of hyper image from one decode of the clip.
+
+    Parameters:
+        image_paths (list): Paths of all the images in the sequence.
+        variants (list): (mode, n) pairs to build, e.g. [('stack', 3), ('diff', 3), ('mean', 5)].
 
-        hyper_images.append((image_paths[i].split('/')[-1], hyper_image))
+    Yields:
+        ((mode, n), hyper_images) for each variant in turn, hyper_images being what make_hyper_image
+        returns. Variants are built one at a time, so only one variant's hyper images are held in memory,
+        but the decoded clip is held throughout; iter_hyper_images keeps memory bounded instead.
+    """
+    for mode, n in variants:
+        assert n % 2 == 1, "n must be an odd number."
+    frames = [load_frame(image_path) for image_path in image_paths]
+    mean_image = clip_mean(frames, len(image_paths)) if any(mode == 'mean' for mode, _ in variants) else None
+    for mode, n in variants:
+        yield (mode, n), _window_hyper_images(frames, image_paths, mode, n, mean_image)
+
+def iter_hyper_images(image_paths, variants):
+    """
+    Streaming form of make_hyper_images: yields each hyper image as soon as its window is decoded,
+    so at most max(n) frames are held in memory however long the clip is.
 
-    return hyper_images
+    A 'mean' variant needs the clip mean before its first window, so the clip is then decoded twice
+    (once for the mean, once for the windows) rather than kept in memory.
+
+    Parameters:
+        image_paths (list): Paths of all the images in the sequence.
+        variants (list): (mode, n) pairs to build.
+
+    Yields:
+        ((mode, n), filename, hyper_image), in frame order.
+    """
+    mean_image = None
+    if any(mode == 'mean' for mode, _ in variants):
+        mean_image = clip_mean((load_frame(image_path) for image_path in image_paths), len(image_paths))
+    frames = (load_frame(image_path) for image_path in image_paths)
+    yield from _iter_windows(frames, image_paths, variants, mean_image)
 
 def save_hyper_image_jpg(save_dir, hyper_images):
     """
@@ -113,21 +199,29 @@ def save_hyper_image_jpg(save_dir, hyper_images):
     os.makedirs(save_dir, exist_ok=True)
 
     for filename, hyper_image in hyper_images:
-        base_filename = os.path.splitext(filename)[0]
+        write_hyper_image_jpg(save_dir, filename, hyper_image)
 
-        f = hyper_image.shape[-1]
+def write_hyper_image_jpg(save_dir, filename, hyper_image):
+    """
+    Renders and saves one hyper image as a JPG (see save_hyper_image_jpg). save_dir must exist.
+    The file is written atomically; returns its path.
+    """
+    base_filename = os.path.splitext(filename)[0]
 
-        if f == 1:
-            central_frame = (hyper_image[:, :, 0] * 255).astype(np.uint8)
-            rendered_image = cv2.cvtColor(central_frame, cv2.COLOR_GRAY2BGR)
-        elif f == 3:
-            rendered_image = cv2.cvtColor((hyper_image * 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
-        else:
-            central_frame = (hyper_image[:, :, f // 2] * 255).astype(np.uint8)
-            rendered_image = cv2.cvtColor(central_frame, cv2.COLOR_GRAY2BGR)
+    f = hyper_image.shape[-1]
+
+    if f == 1:
+        central_frame = (hyper_image[:, :, 0] * 255).astype(np.uint8)
+        rendered_image = cv2.cvtColor(central_frame, cv2.COLOR_GRAY2BGR)
+    elif f == 3:
+        rendered_image = cv2.cvtColor((hyper_image * 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+    else:
+        central_frame = (hyper_image[:, :, f // 2] * 255).astype(np.uint8)
+        rendered_image = cv2.cvtColor(central_frame, cv2.COLOR_GRAY2BGR)
 
-        save_path = os.path.join(save_dir, f"{base_filename}.jpg")
-        cv2.imwrite(save_path, rendered_image, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+    save_path = os.path.join(save_dir, f"{base_filename}.jpg")
+    atomic_imwrite(save_path, rendered_image, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+    return save_path
 
 def copy_labels(label_dir, save_dir, image_files):
     """
@@ -151,6 +245,51 @@ def copy_labels(label_dir, save_dir, image_files):
         else:
             print(f"Warning: Label file {label_file} does not exist.")
 
+def load_labels(label_dir, image_files):
+    """
+    Reads the label files of a clip once, so they can be written to every output without re-reading.
+
+    Parameters:
+        label_dir (str): Path to the original labels' directory.
+        image_files (list): List of image filenames.
+
+    Returns:
+        Dictionary mapping each label filename to its contents (None if the label file does not exist).
+    """
+    labels = {}
+    for image_file in image_files:
+        label_file = os.path.splitext(image_file)[0] + ".txt"
+        try:
+            with open(os.path.join(label_dir, label_file), 'rb') as f:
+                labels[label_file] = f.read()
+        except FileNotFoundError:
+            print(f"Warning: Label file {label_file} does not exist.")
+            labels[label_file] = None
+    return labels
+
+def write_labels(labels, save_dir, image_files):
+    """
+    Writes the labels of image_files from a load_labels lookup into save_dir (like copy_labels).
+
+    Parameters:
+        labels (dict): Label filename -> contents, from load_labels.
+        save_dir (str): Path to the destination labels directory.
+        image_files (list): List of image filenames.
+
+    Returns:
+        List of label files written.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    written = []
+    for image_file in image_files:
+        label_file = os.path.splitext(image_file)[0] + ".txt"
+        content = labels.get(label_file)
+        if content is not None:
+            save_path = os.path.join(save_dir, label_file)
+            atomic_write_bytes(save_path, content)
+            written.append(save_path)
+    return written
+
 def save_hyper_image_npy(save_dir, hyper_images):
     """
     Saves hyper images as numpy arrays.
@@ -164,30 +303,237 @@ def save_hyper_image_npy(save_dir, hyper_images):
     """
     os.makedirs(save_dir, exist_ok=True)
     for filename, hyper_image in hyper_images:
-        base_filename = os.path.splitext(filename)[0]
-        save_path = os.path.join(save_dir, f"{base_filename}.npy")
-        np.save(save_path, hyper_image)
+        write_hyper_image_npy(save_dir, filename, hyper_image)
 
-if __name__ == '__main__':
-    directories = ['cfc_train_2', 'cfc_val_2', 'cfc_channel_test_2']
-    modes = ['stack', 'diff', 'mean']
-    ns = [3]
+def write_hyper_image_npy(save_dir, filename, hyper_image):
+    """
+    Saves one hyper image as a numpy array. save_dir must exist. The file is written atomically; returns its path.
+    """
+    base_filename = os.path.splitext(filename)[0]
+    save_path = os.path.join(save_dir, f"{base_filename}.npy")
+    atomic_np_save(save_path, hyper_image)
+    return save_path
 
+class HyperImageWriter:
+    """
+    Background thread that saves hyper images (and their labels) handed to it through a bounded queue,
+    so computing the next hyper image overlaps with encoding and writing the previous one. put() blocks
+    while queue_size images are waiting, which bounds memory.
+
+    Parameters:
+        outputs (dict): (mode, n) -> (new_image_dir, new_label_dir).
+        labels (dict): Label lookup from load_labels.
+        fmt (str): 'jpg' (save_hyper_image_jpg) or 'npy' (save_hyper_image_npy).
+        queue_size (int): Maximum number of hyper images waiting to be written.
+    """
+    def __init__(self, outputs, labels, fmt='jpg', queue_size=8):
+        self.outputs = outputs
+        self.labels = labels
+        self.write = {'jpg': write_hyper_image_jpg, 'npy': write_hyper_image_npy}[fmt]
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.files = {variant: [] for variant in outputs}
+        for dirs in outputs.values():
+            for d in dirs:
+                os.makedirs(d, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="hyper-image-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so put() never blocks forever
+            variant, filename, hyper_image = item
+            try:
+                new_image_dir, new_label_dir = self.outputs[variant]
+                self.files[variant].append(self.write(new_image_dir, filename, hyper_image))
+                self.files[variant].extend(write_labels(self.labels, new_label_dir, [filename]))
+            except BaseException as e:
+                self.error = e
+
+    def put(self, variant, filename, hyper_image):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((variant, filename, hyper_image))
+
+    def close(self):
+        """
+        Waits for every queued hyper image to be written; re-raises the first write error.
+        Returns the files written for each (mode, n).
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.files
+
+def process_clip(job):
+    """
+    Builds, renders and saves the hyper images of one clip, and copies its labels.
+    :param job: (image_dir, label_dir, clip, outputs, stream) where outputs maps each (mode, n) to its
+                (new_image_dir, new_label_dir). With stream (the default), hyper images go one at a time
+                through a HyperImageWriter, keeping memory at O(n) frames (and decoding the clip twice if a
+                'mean' output is requested). Without it, all outputs are built by make_hyper_images from a
+                single decode held in memory, i.e. O(clip) frames.
+    :return: Dictionary mapping each (mode, n) to the image and label files written for it
+    """
+    image_dir, label_dir, clip, outputs, stream = job
+    image_paths = [os.path.join(image_dir, f) for f in clip]
+    labels = load_labels(label_dir, clip)
+
+    if stream:
+        writer = HyperImageWriter(outputs, labels)
+        try:
+            for variant, filename, hyper_image in iter_hyper_images(image_paths, list(outputs)):
+                writer.put(variant, filename, hyper_image)
+        except BaseException:
+            # Stop the writer thread, but let the original error propagate rather than a write error
+            try:
+                writer.close()
+            except BaseException:
+                pass
+            raise
+        return writer.close()
+
+    files = {}
+    for variant, hyper_images in make_hyper_images(image_paths, list(outputs)):
+        new_image_dir, new_label_dir = outputs[variant]
+        os.makedirs(new_image_dir, exist_ok=True)
+        files[variant] = [write_hyper_image_jpg(new_image_dir, filename, hyper_image) for filename, hyper_image in hyper_images]
+        files[variant] += write_labels(labels, new_label_dir, [image[0] for image in hyper_images])
+    return files
+
+def _init_worker():
+    # One process per core already; keep OpenCV from oversubscribing them
+    cv2.setNumThreads(1)
+
+def make_jobs(directories, modes, ns, single_pass=True, stream=True):
+    """
+    Lists (image_dir, label_dir, clip, outputs, stream) jobs, see process_clip. With single_pass, a clip's job
+    produces every (mode, n) output; otherwise there is one job per clip, mode and n, and the clip is
+    decoded once per job. Every job writes its own files, so jobs can run in any order.
+    """
+    jobs = []
     for directory in directories:
         image_dir = os.path.join(BASE_DIR, directory, "images")
         label_dir = os.path.join(BASE_DIR, directory, "labels")
         clips = get_clips(image_dir)
 
+        outputs = {}
         for mode in modes:
             for n in ns:
-                new_image_dir = os.path.join(BASE_DIR, f"{directory}_{mode}_{n}", "images")
-                new_label_dir = os.path.join(BASE_DIR, f"{directory}_{mode}_{n}", "labels")
+                outputs[(mode, n)] = (
+                    os.path.join(BASE_DIR, f"{directory}_{mode}_{n}", "images"),
+                    os.path.join(BASE_DIR, f"{directory}_{mode}_{n}", "labels"),
+                )
+        for key, clip in clips.items():
+            if single_pass:
+                jobs.append((image_dir, label_dir, clip, outputs, stream))
+            else:
+                jobs.extend((image_dir, label_dir, clip, {variant: dirs}, stream) for variant, dirs in outputs.items())
+    return jobs
+
+def run_jobs(jobs, workers, on_done=None):
+    """
+    Runs the jobs on a pool of workers processes, longest clips first so no
+    worker is left with a long clip at the end. Progress is counted in frames.
+    on_done(k, files), if given, is called in this process as soon as job k finishes.
+    :return: process_clip's result per job, in the order of jobs
+    """
+    for job in jobs:
+        for dirs in job[3].values():
+            for d in dirs:
+                os.makedirs(d, exist_ok=True)
+    order = sorted(range(len(jobs)), key=lambda k: -len(jobs[k][2]) * len(jobs[k][3]))
+    written = [None] * len(jobs)
+
+    with tqdm(total=sum(len(job[2]) for job in jobs), unit="frame", desc=f"{len(jobs)} jobs, {workers} workers") as progress:
+        if workers <= 1:
+            for k in order:
+                written[k] = process_clip(jobs[k])
+                if on_done is not None:
+                    on_done(k, written[k])
+                progress.update(len(jobs[k][2]))
+            return written
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(process_clip, jobs[k]): k for k in order}
+            for future in as_completed(futures):
+                k = futures[future]
+                written[k] = future.result()
+                if on_done is not None:
+                    on_done(k, written[k])
+                progress.update(len(jobs[k][2]))
+    return written
+
+def _manifest_key(new_image_dir, clip):
+    clip_key = '_'.join(clip[0].split('_')[:-1])
+    return f"{os.path.relpath(os.path.dirname(new_image_dir), BASE_DIR)}/{clip_key}"
+
+def _manifest_params(variant):
+    mode, n = variant
+    return {"mode": mode, "n": n, "format": "jpg", "version": OUTPUT_VERSION}
+
+def pending_jobs(jobs, manifest):
+    """
+    Drops the outputs the manifest shows are up to date: built from the same clip frames and label
+    files (by size and mtime) with the same parameters, and still on disk.
+    :return: (jobs that still have outputs to build, their input stamps)
+    """
+    pending, stamps = [], []
+    for image_dir, label_dir, clip, outputs, stream in jobs:
+        inputs = [os.path.join(image_dir, f) for f in clip]
+        inputs += [os.path.join(label_dir, os.path.splitext(f)[0] + ".txt") for f in clip]
+        clip_stamps = manifest.stamps(inputs)
+        stale = {
+            variant: dirs for variant, dirs in outputs.items()
+            if not manifest.is_up_to_date(_manifest_key(dirs[0], clip), clip_stamps, _manifest_params(variant))
+        }
+        if stale:
+            pending.append((image_dir, label_dir, clip, stale, stream))
+            stamps.append(clip_stamps)
+    return pending, stamps
 
-                for key, clip in tqdm(clips.items(), desc=f"Processing {directory = }, {mode = }, {n = }"):
-                    image_paths = [os.path.join(image_dir, f) for f in clip]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate hyper-image datasets from the clips prepared by 1_manage_files.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (1 = run in this process)")
+    parser.add_argument("--single-pass", action=argparse.BooleanOptionalAction, default=True,
+                        help="decode each clip once for all modes and n (--no-single-pass: once per mode and n)")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="write hyper images from a background thread as they are built; memory stays at O(n) frames "
+                             "per clip (--no-stream: hold each decoded clip in memory, decoding it once even for 'mean')")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the build manifest and regenerate every output")
+    args = parser.parse_args()
 
-                    hyper_images = make_hyper_image(image_paths, mode, n)
-                    save_hyper_image_jpg(new_image_dir, hyper_images)
+    directories = ['cfc_train_2', 'cfc_val_2', 'cfc_channel_test_2']
+    modes = ['stack', 'diff', 'mean']
+    ns = [3]
 
-                    image_files = [image[0] for image in hyper_images]
-                    copy_labels(label_dir, new_label_dir, image_files)
+    jobs = make_jobs(directories, modes, ns, single_pass=args.single_pass, stream=args.stream)
+    manifest = BuildManifest(os.path.join(BASE_DIR, ".hyper_image_manifest.json"), BASE_DIR, rebuild=args.rebuild)
+    pending, stamps = pending_jobs(jobs, manifest)
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} jobs up to date")
+
+    # Clips that no longer exist: forget them and delete their hyper images
+    seen = {_manifest_key(dirs[0], clip) for _, _, clip, outputs, _ in jobs for dirs in outputs.values()}
+    prefixes = {os.path.relpath(os.path.dirname(dirs[0]), BASE_DIR) + "/" for _, _, _, outputs, _ in jobs for dirs in outputs.values()}
+    pruned = sum(manifest.prune(prefix, seen) for prefix in prefixes)
+    if pruned:
+        print(f"Removed the outputs of {pruned} clips that no longer exist")
+
+    def record(k, files):
+        # Recorded as each job finishes, so an interrupted run resumes with the jobs not yet recorded
+        clip = pending[k][2]
+        for variant, variant_files in files.items():
+            new_image_dir = pending[k][3][variant][0]
+            manifest.record(_manifest_key(new_image_dir, clip), stamps[k], _manifest_params(variant), variant_files)
+
+    try:
+        written = run_jobs(pending, args.workers, on_done=record)
+    finally:
+        manifest.save()
+    n_images = sum(len(f) for files in written if files for f in files.values())
+    print(f"Wrote {n_images} files from {len(pending)} jobs")
@@ -0,0 +1,174 @@
+###################################################################################################################
+# Build manifest shared by 1_manage_files.py and 2_make_hyper_image.py for incremental, resumable dataset builds.
+# Each entry records the stamps (size and mtime, or a content hash) of the inputs an output was built from, the
+# parameters used and the output files. On a re-run, outputs whose entry still matches are skipped.
+# Outputs are written atomically and recorded only after they are complete, so an interrupted build resumes by
+# rebuilding exactly the outputs that were never recorded. Each record is appended to a journal next to the
+# manifest; save() folds the journal into the manifest, so a build writes O(N) bytes however often it records.
+###################################################################################################################
+
+import hashlib
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+def file_stamp(path, use_hash=False):
+    """
+    Cheap fingerprint of a file: [size, mtime_ns], or its sha1 if use_hash is set (for files whose mtime
+    may change without their contents changing). None if the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not use_hash:
+        return [st.st_size, st.st_mtime_ns]
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def atomic_write_bytes(path, data):
+    """
+    Writes data to path through a temporary file in the same directory, so path is either the old
+    file or the complete new one, never a partial write.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def atomic_imwrite(path, image, params=()):
+    """cv2.imwrite with the same encoder, written atomically (see atomic_write_bytes)."""
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1], image, list(params))
+    if not ok:
+        raise IOError(f"Failed to encode {path}")
+    atomic_write_bytes(path, encoded.tobytes())
+
+
+def atomic_np_save(path, array):
+    """np.save, written atomically (see atomic_write_bytes)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class BuildManifest:
+    """
+    JSON manifest mapping an output key to {"inputs": {path: stamp}, "params": {...}, "outputs": [paths]}.
+    Paths are stored relative to root so the dataset folder can be moved.
+
+    record() appends one JSON line to the journal (path + ".journal") and flushes it, so every finished
+    output survives a crash; the journal is replayed on load and folded into the manifest by save().
+
+    Parameters:
+        path (str): Manifest file.
+        root (str): Directory that input and output paths are relative to.
+        rebuild (bool): Ignore previous entries, i.e. treat every output as out of date.
+    """
+    def __init__(self, path, root, rebuild=False):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.root = root
+        self.entries = {}
+        if rebuild:
+            self._remove_journal()
+        else:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    self.entries = json.load(f).get("entries", {})
+            self._replay_journal()
+        self._journal = None
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    key, entry = json.loads(line)
+                except ValueError:
+                    break  # a line cut short by a crash; everything after it is lost too
+                if entry is None:
+                    self.entries.pop(key, None)
+                else:
+                    self.entries[key] = entry
+
+    def _remove_journal(self):
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+    def _append(self, key, entry):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            self._journal = open(self.journal_path, 'a')
+        self._journal.write(json.dumps([key, entry]) + "\n")
+        self._journal.flush()
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root)
+
+    def stamps(self, inputs, use_hash=False):
+        """Stamps of input paths, keyed as stored in the manifest."""
+        return {self._rel(p): file_stamp(p, use_hash) for p in inputs}
+
+    def is_up_to_date(self, key, stamps, params):
+        """True if key was built from exactly these input stamps and params and all its outputs still exist."""
+        entry = self.entries.get(key)
+        if entry is None or entry["params"] != params or entry["inputs"] != stamps:
+            return False
+        return all(os.path.exists(os.path.join(self.root, p)) for p in entry["outputs"])
+
+    def previous_outputs(self, key):
+        """Absolute paths of the outputs recorded for key by an earlier build."""
+        entry = self.entries.get(key)
+        return [os.path.join(self.root, p) for p in entry["outputs"]] if entry else []
+
+    def _remove_outputs(self, paths):
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+
+    def record(self, key, stamps, params, outputs):
+        """
+        Records key as built. Outputs of the previous build of key that this build did not produce
+        (e.g. frames removed from a clip) are deleted.
+        """
+        outputs = [self._rel(p) for p in outputs]
+        keep = set(outputs)
+        self._remove_outputs(old for old in self.entries.get(key, {}).get("outputs", []) if old not in keep)
+        self.entries[key] = {"inputs": stamps, "params": params, "outputs": outputs}
+        self._append(key, self.entries[key])
+
+    def prune(self, prefix, seen):
+        """
+        Forgets the keys starting with prefix that are not in seen (e.g. source frames or clips that are
+        gone) and deletes their outputs. Returns the number of keys removed.
+        """
+        stale = [key for key in self.entries if key.startswith(prefix) and key not in seen]
+        for key in stale:
+            self._remove_outputs(self.entries.pop(key)["outputs"])
+            self._append(key, None)
+        return len(stale)
+
+    def save(self):
+        """Writes every entry to the manifest file and empties the journal."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = json.dumps({"saved": time.strftime("%Y-%m-%dT%H:%M:%S"), "entries": self.entries})
+        atomic_write_bytes(self.path, data.encode())
+        self._remove_journal()
@@ -0,0 +1,85 @@
+import os
+
+from build_manifest import BuildManifest
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+
+def _build(root, manifest, key, source, outputs, params):
+    """Builds outputs from source the way the scripts do: check, write, record."""
+    stamps = manifest.stamps([source])
+    if manifest.is_up_to_date(key, stamps, params):
+        return False
+    paths = [_write(os.path.join(root, out), "built") for out in outputs]
+    manifest.record(key, stamps, params, paths)
+    return True
+
+
+def test_skips_only_unchanged_outputs(tmp_path):
+    root = str(tmp_path)
+    source = _write(os.path.join(root, "raw", "a.png"), "a")
+    path = os.path.join(root, "manifest.json")
+    manifest = BuildManifest(path, root)
+    assert _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 3})
+    assert not _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 3})
+    manifest.save()
+
+    manifest = BuildManifest(path, root)
+    assert not _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 3})
+    assert _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 5})
+
+    _write(source, "changed")
+    assert _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 5})
+
+    os.remove(os.path.join(root, "out", "a.jpg"))
+    assert _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 5})
+    manifest.save()
+
+    manifest = BuildManifest(path, root, rebuild=True)
+    assert manifest.entries == {}
+    assert _build(root, manifest, "a", source, ["out/a.jpg"], {"n": 5})
+
+
+def test_journal_survives_a_crash_and_save_folds_it_in(tmp_path):
+    root = str(tmp_path)
+    path = os.path.join(root, "manifest.json")
+    manifest = BuildManifest(path, root)
+    sources = [_write(os.path.join(root, "raw", f"{i}.png"), str(i)) for i in range(5)]
+    for i, source in enumerate(sources):
+        _build(root, manifest, str(i), source, [f"out/{i}.jpg"], {})
+    assert not os.path.exists(path)
+
+    # No save(): a new process replays the journal, ignoring a line cut short by the crash
+    with open(manifest.journal_path, 'a') as f:
+        f.write('["5", {"inputs"')
+    resumed = BuildManifest(path, root)
+    assert sorted(resumed.entries) == ["0", "1", "2", "3", "4"]
+    assert not any(_build(root, resumed, str(i), s, [f"out/{i}.jpg"], {}) for i, s in enumerate(sources))
+
+    resumed.save()
+    assert os.path.exists(path) and not os.path.exists(resumed.journal_path)
+    assert BuildManifest(path, root).entries == resumed.entries
+
+
+def test_record_and_prune_delete_outputs_that_are_no_longer_built(tmp_path):
+    root = str(tmp_path)
+    path = os.path.join(root, "manifest.json")
+    manifest = BuildManifest(path, root)
+    clip = _write(os.path.join(root, "raw", "clip"), "3 frames")
+    _build(root, manifest, "clips/clip", clip, ["out/0.jpg", "out/1.jpg", "out/2.jpg"], {})
+    other = _write(os.path.join(root, "raw", "other"), "x")
+    _build(root, manifest, "clips/other", other, ["out/other.jpg"], {})
+    _build(root, manifest, "labels/other", other, ["out/other.txt"], {})
+
+    _write(clip, "two frames")
+    _build(root, manifest, "clips/clip", clip, ["out/0.jpg", "out/1.jpg"], {})
+    assert sorted(os.listdir(os.path.join(root, "out"))) == ["0.jpg", "1.jpg", "other.jpg", "other.txt"]
+
+    assert manifest.prune("clips/", {"clips/clip"}) == 1
+    assert sorted(os.listdir(os.path.join(root, "out"))) == ["0.jpg", "1.jpg", "other.txt"]
+    assert sorted(BuildManifest(path, root).entries) == ["clips/clip", "labels/other"]
@@ -0,0 +1,144 @@
+###################################################################################################################
+# Benchmarks make_hyper_image from 2_make_hyper_image.py against the original per-window implementation
+# (kept below as legacy_make_hyper_image): JPEG decodes and wall time per clip as n grows, and checks that
+# both produce byte-identical hyper images. Also reports decodes when make_hyper_images builds every
+# (mode, n) from a single pass over the clip.
+# Uses a synthetic clip unless --clip-dir points at a directory of frames (e.g. one clip of cfc_train_2/images).
+###################################################################################################################
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))  # for build_manifest, imported by 2_make_hyper_image.py
+spec = importlib.util.spec_from_file_location("make_hyper_image", os.path.join(HERE, "..", "2_make_hyper_image.py"))
+mhi = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mhi)
+
+
+def legacy_make_hyper_image(image_paths, mode, n):
+    """The original implementation: every window re-reads and re-decodes its n frames."""
+    assert n % 2 == 1, "n must be an odd number."
+    half_n = n // 2
+    total_frames = len(image_paths)
+
+    hyper_images = []
+    mean_image = None
+    if mode == 'mean':
+        for image_path in image_paths:
+            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).astype(np.float32) / 255.0
+            if mean_image is None:
+                mean_image = image / total_frames
+            else:
+                mean_image += image / total_frames
+
+    for i in range(half_n, total_frames - half_n):
+        frames = []
+        for j in range(i - half_n, i + half_n + 1):
+            frames.append(cv2.imread(image_paths[j], cv2.IMREAD_GRAYSCALE).astype(np.float32) / 255.0)
+
+        if mode == 'stack':
+            hyper_image = np.stack(frames, axis=-1)
+        elif mode == 'diff':
+            central_frame = frames[half_n]
+            differences = [(frame - central_frame) / 2 + 0.5 for frame in frames]
+            differences[half_n] = central_frame
+            hyper_image = np.stack(differences, axis=-1)
+        else:
+            differences = [(frame - mean_image) / 2 + 0.5 for frame in frames]
+            differences[half_n] = frames[half_n]
+            hyper_image = np.stack(differences, axis=-1)
+
+        hyper_images.append((image_paths[i].split('/')[-1], hyper_image))
+
+    return hyper_images
+
+
+def make_synthetic_clip(directory, frames, width, height):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 80, (height, width), dtype=np.uint8)
+    paths = []
+    for i in range(frames):
+        frame = background.copy()
+        cv2.circle(frame, (20 + i * (width - 40) // max(frames - 1, 1), height // 2), 6, 255, -1)
+        path = os.path.join(directory, f"synthetic_clip_{i}.jpg")
+        cv2.imwrite(path, frame)
+        paths.append(path)
+    return paths
+
+
+def run(fn, image_paths, mode, n):
+    """Returns (hyper_images, decodes, seconds) for one call of fn."""
+    imread = cv2.imread
+    decodes = [0]
+
+    def counting_imread(*args, **kwargs):
+        decodes[0] += 1
+        return imread(*args, **kwargs)
+
+    cv2.imread = counting_imread
+    try:
+        start = time.perf_counter()
+        hyper_images = fn(image_paths, mode, n)
+        elapsed = time.perf_counter() - start
+    finally:
+        cv2.imread = imread
+    return hyper_images, decodes[0], elapsed
+
+
+def identical(a, b):
+    return len(a) == len(b) and all(
+        name_a == name_b and img_a.dtype == img_b.dtype and np.array_equal(img_a, img_b)
+        for (name_a, img_a), (name_b, img_b) in zip(a, b)
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Decode count and wall time of make_hyper_image vs. the original")
+    parser.add_argument("--clip-dir", default=None, help="directory of .jpg frames of one clip")
+    parser.add_argument("--frames", type=int, default=60, help="synthetic clip length")
+    parser.add_argument("--size", default="512x256", help="synthetic frame size WxH")
+    parser.add_argument("--ns", default="1,3,5,7,9")
+    parser.add_argument("--modes", default="stack,diff,mean")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.clip_dir:
+            image_paths = [os.path.join(args.clip_dir, f) for f in sorted(os.listdir(args.clip_dir)) if f.endswith('.jpg')]
+        else:
+            width, height = (int(v) for v in args.size.split("x"))
+            image_paths = make_synthetic_clip(tmp, args.frames, width, height)
+
+        print(f"{len(image_paths)} frames")
+        print(f"{'mode':>5} {'n':>3} {'decodes old':>12} {'decodes new':>12} {'old s':>8} {'new s':>8} {'speedup':>8}  identical")
+        all_identical = True
+        total_old = total_new = 0
+        for mode in args.modes.split(","):
+            for n in (int(v) for v in args.ns.split(",")):
+                old, old_decodes, old_s = run(legacy_make_hyper_image, image_paths, mode, n)
+                new, new_decodes, new_s = run(mhi.make_hyper_image, image_paths, mode, n)
+                same = identical(old, new)
+                all_identical &= same
+                total_old += old_decodes
+                total_new += new_decodes
+                print(f"{mode:>5} {n:>3} {old_decodes:>12} {new_decodes:>12} {old_s:>8.3f} {new_s:>8.3f} "
+                      f"{old_s / new_s:>7.2f}x  {same}")
+
+        # Single pass: every (mode, n) above from one decode of the clip
+        variants = [(mode, int(n)) for mode in args.modes.split(",") for n in args.ns.split(",")]
+
+        def single_pass(paths, mode, n):
+            return list(mhi.make_hyper_images(paths, variants))
+
+        _, single_decodes, single_s = run(single_pass, image_paths, None, None)
+        print(f"all {len(variants)} variants: {total_old} decodes (original), {total_new} (per variant), "
+              f"{single_decodes} (make_hyper_images, {single_s:.3f}s)")
+        if not all_identical:
+            raise SystemExit("Outputs differ from the original implementation")
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+COLUMNS = ("frame", "time_s", "class_id", "confidence", "bbox", "track_id")
+INDEX_NAME = "index.json"
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    return {
+        "frame": np.zeros(0, np.int64),
+        "time_s": np.zeros(0, np.float64),
+        "class_id": np.zeros(0, np.int64),
+        "confidence": np.zeros(0, np.float32),
+        "bbox": np.zeros((0, 4), np.float32),
+        "track_id": np.zeros(0, np.int64),
+    }
+
+
+class DetectionLog:
+    """
+    Append-only, chunked columnar store of per-frame detections for one recording.
+
+    A log is a directory of chunk_NNNNNN.npz files, each holding the columns
+    frame, time_s, class_id, confidence, bbox (N, 4 xyxy) and track_id (-1
+    when untracked) for chunk_frames consecutive frames, plus index.json with
+    each chunk's frame and time range. Frames must be appended in increasing
+    order; reopening an existing directory continues after its last chunk.
+
+    query() reads only the chunks whose range overlaps the request and slices
+    them with a binary search, so "detections between minute 12 and 15" never
+    touches the video or the detector.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fps: Optional[float] = None,
+        names: Optional[Dict[int, str]] = None,
+        chunk_frames: int = 1800,
+    ):
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        os.makedirs(directory, exist_ok=True)
+
+        index_path = os.path.join(directory, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {"fps": None, "names": {}, "chunks": []}
+        if fps is not None:
+            self.index["fps"] = float(fps)
+        if names:
+            self.index["names"] = {str(k): v for k, v in dict(names).items()}
+
+        chunks = self.index["chunks"]
+        self.last_frame = chunks[-1]["frame_end"] if chunks else -1
+        self._pending: List[Dict[str, np.ndarray]] = []
+        self._pending_first: Optional[int] = None
+        self._pending_last: Optional[int] = None
+        self._pending_t = (0.0, 0.0)
+
+    @property
+    def fps(self) -> Optional[float]:
+        return self.index["fps"]
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return {int(k): v for k, v in self.index["names"].items()}
+
+    def append(
+        self,
+        frame_index: int,
+        bbox: np.ndarray,
+        confidence: np.ndarray,
+        class_id: np.ndarray,
+        track_id: Optional[np.ndarray] = None,
+        time_s: Optional[float] = None,
+    ) -> None:
+        """Records one frame's detections (possibly none). time_s defaults to frame_index / fps."""
+        if frame_index <= self.last_frame:
+            raise ValueError(
+                f"Frame {frame_index} is not after the last logged frame {self.last_frame}; "
+                "logs are append-only, use a new directory for a new recording"
+            )
+        if time_s is None:
+            if not self.fps:
+                raise ValueError("time_s is required when the log has no fps")
+            time_s = frame_index / self.fps
+
+        n = len(confidence)
+        self._pending.append({
+            "frame": np.full(n, frame_index, np.int64),
+            "time_s": np.full(n, time_s, np.float64),
+            "class_id": np.asarray(class_id, np.int64).reshape(n),
+            "confidence": np.asarray(confidence, np.float32).reshape(n),
+            "bbox": np.asarray(bbox, np.float32).reshape(n, 4),
+            "track_id": np.full(n, -1, np.int64) if track_id is None else np.asarray(track_id, np.int64).reshape(n),
+        })
+        if self._pending_first is None:
+            self._pending_first = frame_index
+            self._pending_t = (time_s, time_s)
+        self._pending_last = frame_index
+        self._pending_t = (self._pending_t[0], time_s)
+        self.last_frame = frame_index
+
+        if frame_index - self._pending_first + 1 >= self.chunk_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered frames as a new chunk and updates the index."""
+        if self._pending_first is None:
+            return
+        columns = {c: np.concatenate([p[c] for p in self._pending]) for c in COLUMNS}
+        name = f"chunk_{len(self.index['chunks']):06d}.npz"
+        tmp_path = os.path.join(self.directory, f".{name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+        self.index["chunks"].append({
+            "file": name,
+            "rows": int(len(columns["frame"])),
+            "frame_start": int(self._pending_first),
+            "frame_end": int(self._pending_last),
+            "t_start": float(self._pending_t[0]),
+            "t_end": float(self._pending_t[1]),
+        })
+        self._write_index()
+        self._pending = []
+        self._pending_first = self._pending_last = None
+
+    def absorb(self, directory: str, track_id_offset: int = 0, move: bool = False) -> None:
+        """
+        Appends every chunk of another log (e.g. one shard of a recording) after
+        this log's frames, shifting its track ids by track_id_offset. Chunks
+        are copied (or moved) as files unless their track ids need rewriting.
+        """
+        self.flush()
+        other = DetectionLog(directory)
+        for chunk in other.index["chunks"]:
+            if chunk["frame_start"] <= self.last_frame:
+                raise ValueError(
+                    f"{directory} starts at frame {chunk['frame_start']}, not after frame {self.last_frame}"
+                )
+            name = f"chunk_{len(self.index['chunks']):06d}.npz"
+            src = os.path.join(directory, chunk["file"])
+            dst = os.path.join(self.directory, name)
+            if track_id_offset:
+                with np.load(src) as data:
+                    columns = {c: data[c] for c in COLUMNS}
+                columns["track_id"] = np.where(columns["track_id"] >= 0, columns["track_id"] + track_id_offset, -1)
+                tmp_path = os.path.join(self.directory, f".{name}.{os.getpid()}.tmp.npz")
+                np.savez(tmp_path, **columns)
+                os.replace(tmp_path, dst)
+            elif move:
+                shutil.move(src, dst)
+            else:
+                shutil.copyfile(src, dst)
+            self.index["chunks"].append(dict(chunk, file=name))
+            self.last_frame = chunk["frame_end"]
+        if not self.index["names"]:
+            self.index["names"] = other.index["names"]
+        if self.index["fps"] is None:
+            self.index["fps"] = other.index["fps"]
+        self._write_index()
+
+    @staticmethod
+    def last_logged_frame(directory: str) -> int:
+        """Last frame recorded in the log at directory, or -1 if there is none (without opening it)."""
+        index_path = os.path.join(directory, INDEX_NAME)
+        if not os.path.exists(index_path):
+            return -1
+        with open(index_path) as f:
+            chunks = json.load(f)["chunks"]
+        return chunks[-1]["frame_end"] if chunks else -1
+
+    @staticmethod
+    def remove(directory: str) -> None:
+        """Deletes the chunks and index of the log at directory, leaving other files alone."""
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name == INDEX_NAME or (name.startswith("chunk_") and name.endswith(".npz")):
+                os.remove(os.path.join(directory, name))
+
+    def _write_index(self) -> None:
+        index_path = os.path.join(self.directory, INDEX_NAME)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, index_path)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "DetectionLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def query(
+        self,
+        start_s: Optional[float] = None,
+        end_s: Optional[float] = None,
+        start_frame: Optional[int] = None,
+        end_frame: Optional[int] = None,
+        class_id: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Detections with start <= time (or frame) < end, as concatenated columns.
+        Bounds left as None are open; only flushed chunks are searched.
+        """
+        key, lo, hi = ("time_s", start_s, end_s) if start_frame is None and end_frame is None \
+            else ("frame", start_frame, end_frame)
+        first, last = ("t_start", "t_end") if key == "time_s" else ("frame_start", "frame_end")
+
+        parts = []
+        for chunk in self.index["chunks"]:
+            if (hi is not None and chunk[first] >= hi) or (lo is not None and chunk[last] < lo):
+                continue
+            with np.load(os.path.join(self.directory, chunk["file"])) as data:
+                column = data[key]
+                i = 0 if lo is None else int(np.searchsorted(column, lo, side="left"))
+                j = len(column) if hi is None else int(np.searchsorted(column, hi, side="left"))
+                if j > i:
+                    parts.append({c: data[c][i:j] for c in COLUMNS})
+
+        if not parts:
+            return _empty_columns()
+        result = {c: np.concatenate([p[c] for p in parts]) for c in COLUMNS}
+        if class_id is not None:
+            keep = result["class_id"] == class_id
+            result = {c: v[keep] for c, v in result.items()}
+        return result
+
+    def summary(self, **query_kwargs: Any) -> Dict[str, Any]:
+        """Row count, frames with detections and per-class counts for a query()."""
+        rows = self.query(**query_kwargs)
+        ids, counts = np.unique(rows["class_id"], return_counts=True)
+        names = self.names
+        return {
+            "detections": int(len(rows["frame"])),
+            "frames_with_detections": int(len(np.unique(rows["frame"]))),
+            "unique_tracks": int(len(np.unique(rows["track_id"][rows["track_id"] >= 0]))),
+            "counts_by_class": {names.get(i, str(i)): c for i, c in zip(ids.tolist(), counts.tolist())},
+        }
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Seconds from 'SS', 'MM:SS' or 'HH:MM:SS'."""
+    if value is None:
+        return None
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a detection log written by detect_on_video(log_dir=...)")
+    parser.add_argument("log_dir")
+    parser.add_argument("--start", help="start time, e.g. 12:00")
+    parser.add_argument("--end", help="end time, e.g. 15:00")
+    parser.add_argument("--class-id", type=int, default=None)
+    args = parser.parse_args()
+
+    log = DetectionLog(args.log_dir)
+    print(json.dumps(log.summary(start_s=_parse_time(args.start), end_s=_parse_time(args.end),
+                                 class_id=args.class_id), indent=2))
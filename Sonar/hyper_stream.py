@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+from collections import deque
+from typing import List, Optional, Tuple
+
+MODES = ("stack", "diff")
+
+
+class HyperImageStream:
+    """
+    Streaming version of Hyper-Image-main/2_make_hyper_image.make_hyper_image for live inference.
+
+    Keeps the last n grayscale frames (normalized to [0, 1] float32 once, on
+    arrival) in a ring buffer and, for every pushed frame, emits the hyper-image
+    centered half_n = n // 2 frames back, rendered exactly like the training
+    JPGs from save_hyper_image_jpg: channels scaled by 255 and truncated to
+    uint8, in BGR order as cv2.imread would return them. Emission therefore
+    lags the input by half_n frames; the first frame is repeated to fill the
+    window at the start, and flush() repeats the last frame to emit the
+    trailing half_n frames.
+
+    'mean' mode needs the whole clip's mean frame and cannot be streamed.
+    """
+
+    def __init__(self, mode: str = "diff", n: int = 3):
+        if mode not in MODES:
+            raise ValueError(f"Streaming hyper-images support {MODES}; got {mode!r}")
+        if n % 2 != 1:
+            raise ValueError("n must be an odd number.")
+        self.mode = mode
+        self.n = n
+        self.half_n = n // 2
+
+        self._ring: Optional[np.ndarray] = None  # (n, H, W) float32
+        self._head = 0  # next slot to overwrite (the oldest frame once full)
+        self._filled = 0
+        self._last_gray: Optional[np.ndarray] = None
+        self._pending: deque = deque()  # (frame_index, raw frame) not yet emitted
+        self._next_index = 0
+
+    def _put(self, gray: np.ndarray) -> None:
+        if self._ring is None or self._ring.shape[1:] != gray.shape:
+            self._ring = np.empty((self.n,) + gray.shape, dtype=np.float32)
+            self._head = self._filled = 0
+            # Replicate the first frame so it can be the center of a full window
+            for _ in range(self.half_n):
+                self._put(gray)
+        self._ring[self._head] = gray.astype(np.float32) / 255.0
+        self._head = (self._head + 1) % self.n
+        self._filled = min(self._filled + 1, self.n)
+
+    def _render(self) -> np.ndarray:
+        order = [(self._head + k) % self.n for k in range(self.n)]  # oldest to newest
+        if self.n != 3:
+            # save_hyper_image_jpg keeps only the central frame unless there are exactly 3 channels
+            center = (self._ring[order[self.half_n]] * 255).astype(np.uint8)
+            return cv2.cvtColor(center, cv2.COLOR_GRAY2BGR)
+
+        center = self._ring[order[self.half_n]]
+        channels = []
+        for k, slot in enumerate(order):
+            if self.mode == "stack" or k == self.half_n:
+                channels.append(self._ring[slot])
+            else:
+                channels.append((self._ring[slot] - center) / 2 + 0.5)
+        hyper = np.stack(channels, axis=-1)
+        # Training JPGs were written with cvtColor(RGB2BGR), i.e. channel order reversed
+        return (hyper * 255).astype(np.uint8)[:, :, ::-1]
+
+    def _emit(self) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        if self._filled < self.n or not self._pending:
+            return None
+        index, raw = self._pending.popleft()
+        return index, raw, self._render()
+
+    def push(self, frame: np.ndarray) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Adds one decoded frame (BGR or grayscale). Returns (frame_index, raw
+        frame, hyper-image) for the frame half_n positions back, or None while
+        the window is still filling.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        self._pending.append((self._next_index, frame))
+        self._next_index += 1
+        self._last_gray = gray
+        self._put(gray)
+        return self._emit()
+
+    def flush(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """Emits the frames still waiting for their right-hand neighbours, padding with the last frame."""
+        out = []
+        while self._pending and self._last_gray is not None:
+            self._put(self._last_gray)
+            emitted = self._emit()
+            if emitted is not None:
+                out.append(emitted)
+        return out
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+from typing import Any, Dict
+
+
+class MotionGate:
+    """
+    Decides whether a frame has changed enough to be worth running the detector on.
+
+    The frame is converted to grayscale and downscaled to `width` pixels wide;
+    its energy is the mean squared cv2.absdiff against the (downscaled) frame
+    the detector last ran on, so slow drift accumulates until it crosses the
+    threshold. Squaring keeps a small bright echo from being averaged away by
+    the static background. The threshold adapts to the recording's noise
+    floor: it is max(min_threshold, mean + k * std) of the energies of frames
+    judged static, tracked as exponential moving averages with rate `ema`. The first
+    `warmup` frames always pass, and a frame passes after max_skip consecutive
+    skips regardless of energy.
+    """
+
+    def __init__(
+        self,
+        width: int = 160,
+        k: float = 4.0,
+        ema: float = 0.05,
+        min_threshold: float = 4.0,
+        warmup: int = 5,
+        max_skip: int = 150,
+    ):
+        self.width = width
+        self.k = k
+        self.ema = ema
+        self.min_threshold = min_threshold
+        self.warmup = warmup
+        self.max_skip = max_skip
+
+        self._reference = None
+        self._noise_mean = 0.0
+        self._noise_var = 0.0
+        self._since_detect = 0
+
+        self.frames = 0
+        self.skipped = 0
+        self.last_energy = 0.0
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape[:2]
+        height = max(1, int(round(h * self.width / w)))
+        return cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    @property
+    def threshold(self) -> float:
+        return max(self.min_threshold, self._noise_mean + self.k * float(np.sqrt(self._noise_var)))
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """True if the detector should run on this frame; False to reuse the last detections."""
+        small = self._small_gray(frame)
+        self.frames += 1
+
+        if self._reference is None or self._reference.shape != small.shape:
+            self._reference = small
+            self._since_detect = 0
+            return True
+
+        diff = cv2.absdiff(small, self._reference).astype(np.float32)
+        energy = float(np.mean(diff * diff))
+        self.last_energy = energy
+
+        detect = (
+            self.frames <= self.warmup
+            or energy >= self.threshold
+            or self._since_detect >= self.max_skip
+        )
+        if energy < self.threshold:
+            # Only static frames feed the noise-floor estimate, so motion does not raise the bar
+            delta = energy - self._noise_mean
+            self._noise_mean += self.ema * delta
+            self._noise_var = (1 - self.ema) * (self._noise_var + self.ema * delta * delta)
+
+        if detect:
+            self._reference = small
+            self._since_detect = 0
+        else:
+            self._since_detect += 1
+            self.skipped += 1
+        return detect
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counts over the frames passed to should_detect (gated_frames). A caller that only
+        consults the gate on some frames (e.g. frames a tracker scheduled) must scale by
+        its own frame count to get a fraction of the whole video.
+        """
+        return {
+            "gated_frames": self.frames,
+            "skipped": self.skipped,
+            "skip_fraction_of_gated": self.skipped / self.frames if self.frames else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+from threadpoolctl import threadpool_limits
+
+try:
+    from detection_log import DetectionLog
+except ImportError:
+    from .detection_log import DetectionLog
+
+
+def _init_worker(threads: int) -> None:
+    # cv2 and numpy are already loaded by now, so cap the live pools rather than *_NUM_THREADS
+    import torch
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    threadpool_limits(limits=threads)
+
+
+def _run_shard(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        from testsonar import detect_on_video
+    except ImportError:
+        from .testsonar import detect_on_video
+
+    start = time.perf_counter()
+    _, stats = detect_on_video(headless=True, return_stats=True, **kwargs)
+    stats["wall_s"] = time.perf_counter() - start
+    return stats
+
+
+def count_frames(path: str) -> int:
+    """
+    Frames in the video at path. The container's frame count is used if the video has a frame
+    at its last index and none after it; otherwise (no count, or a wrong one) the frames are
+    counted with grab(), which skips decoding the pixels.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, total - 1)
+        if cap.grab() and not cap.grab():
+            cap.release()
+            return total
+        cap.release()
+        cap = cv2.VideoCapture(path)
+    total = 0
+    while cap.grab():
+        total += 1
+    cap.release()
+    return total
+
+
+def shard_ranges(total_frames: int, shards: int) -> List[Tuple[int, int]]:
+    """Splits [0, total_frames) into `shards` contiguous, nearly equal [start, end) ranges."""
+    shards = max(1, min(shards, total_frames))
+    bounds = [round(i * total_frames / shards) for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards)]
+
+
+def _concat_videos(paths: List[str], output_path: str) -> int:
+    """
+    Encodes the (lossless) segments, in order, into one mp4v video; returns frames written.
+    This is the only lossy encode, as in a single-process run.
+    """
+    writer = None
+    frames = 0
+    try:
+        for path in paths:
+            cap = cv2.VideoCapture(path)
+            if writer is None:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)  # type: ignore
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                writer.write(frame)
+                frames += 1
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+    return frames
+
+
+def detect_on_video_sharded(
+    input_path: str,
+    output_path: str = "out_annotated.mp4",
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    context_frames: int = 30,
+    log_dir: Optional[str] = None,
+    log_overwrite: bool = False,
+    compare_single: bool = False,
+    **video_kwargs: Any,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Runs detect_on_video over a long recording in `workers` processes.
+
+    The video is split into contiguous frame ranges, one per worker. Each
+    worker loads its own detector, is capped at threads_per_worker threads,
+    and also processes context_frames frames on each side of its range (not
+    written) so tracking, motion gating and hyper-images warm up as they would
+    in a single pass. The annotated segments are then concatenated in order,
+    and the per-shard detection logs appended into log_dir with track ids
+    offset so they stay unique (a fish crossing a shard boundary gets a new id).
+    An existing log in log_dir is replaced if log_overwrite is set and
+    otherwise rejected, before any shard starts.
+
+    Shards write lossless FFV1 segments, so the final mp4v encode is the only
+    lossy one. Every shard but the last must write exactly its range; the last
+    reads to the end of the video, so a wrong frame count cannot drop
+    trailing frames.
+
+    video_kwargs are passed through to detect_on_video (model_path, conf,
+    track, hyper_mode, ...). With compare_single, the same video is also run
+    through single-process detect_on_video and the speedup is reported.
+    Returns (output_path, stats).
+    """
+    if log_dir:
+        if log_overwrite:
+            DetectionLog.remove(log_dir)
+        elif DetectionLog.last_logged_frame(log_dir) >= 0:
+            raise ValueError(
+                f"{log_dir} already logs frames up to {DetectionLog.last_logged_frame(log_dir)}; "
+                "pass log_overwrite=True to replace it, or use a new directory"
+            )
+
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    threads_per_worker = threads_per_worker or max(1, cpus // workers)
+    total = count_frames(input_path)
+    ranges = shard_ranges(total, workers)
+
+    work_dir = tempfile.mkdtemp(prefix="sonar-shards-", dir=os.path.dirname(os.path.abspath(output_path)))
+    jobs = []
+    for i, (start, end) in enumerate(ranges):
+        jobs.append(dict(
+            video_kwargs,
+            input_path=input_path,
+            output_path=os.path.join(work_dir, f"shard_{i:03d}.avi"),
+            fourcc="FFV1",
+            log_dir=os.path.join(work_dir, f"shard_{i:03d}_log") if log_dir else None,
+            start_frame=start,
+            end_frame=end if i < len(ranges) - 1 else None,
+            context_frames=context_frames,
+        ))
+
+    start_t = time.perf_counter()
+    try:
+        # spawn: torch is not fork-safe once its thread pools exist
+        with ProcessPoolExecutor(max_workers=len(jobs), mp_context=get_context("spawn"),
+                                 initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+            shard_stats = list(pool.map(_run_shard, jobs))
+        process_s = time.perf_counter() - start_t
+
+        for (start, end), shard in zip(ranges[:-1], shard_stats):
+            if shard["written_frames"] != end - start:
+                raise RuntimeError(
+                    f"Shard [{start}, {end}) wrote {shard['written_frames']} frames, expected {end - start}"
+                )
+
+        t0 = time.perf_counter()
+        frames = _concat_videos([job["output_path"] for job in jobs], output_path)
+        written = sum(shard["written_frames"] for shard in shard_stats)
+        if frames != written:
+            raise RuntimeError(f"Stitched video has {frames} frames, the shards wrote {written}")
+        if log_dir:
+            log = DetectionLog(log_dir)
+            offset = 0
+            for job, shard in zip(jobs, shard_stats):
+                log.absorb(job["log_dir"], track_id_offset=offset, move=True)
+                offset += shard.get("unique_tracks", 0)
+        stitch_s = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start_t
+    stats: Dict[str, Any] = {
+        "workers": len(jobs),
+        "threads_per_worker": threads_per_worker,
+        "context_frames": context_frames,
+        "frames": frames,
+        "process_s": process_s,
+        "stitch_s": stitch_s,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "shards": [
+            {"start_frame": s, "end_frame": e, "written_frames": st["written_frames"], "wall_s": st["wall_s"],
+             "detector_runs": st["detector_runs"]}
+            for (s, e), st in zip(ranges, shard_stats)
+        ],
+    }
+    print(f"[sharded] {frames} frames, {len(jobs)} workers x {threads_per_worker} threads: "
+          f"{elapsed:.1f}s ({process_s:.1f}s processing, {stitch_s:.1f}s stitching)")
+
+    if compare_single:
+        single_out = os.path.join(os.path.dirname(os.path.abspath(output_path)), f".single-{os.getpid()}.mp4")
+        try:
+            t0 = time.perf_counter()
+            _run_shard(dict(video_kwargs, input_path=input_path, output_path=single_out))
+            single_s = time.perf_counter() - t0
+        finally:
+            if os.path.exists(single_out):
+                os.remove(single_out)
+        stats["single_process_s"] = single_s
+        stats["speedup"] = single_s / elapsed if elapsed > 0 else None
+        print(f"[sharded] single process: {single_s:.1f}s -> speedup {stats['speedup']:.2f}x")
+
+    return output_path, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded multi-process detect_on_video for long recordings")
+    parser.add_argument("input_path")
+    parser.add_argument("--out", default="out_annotated.mp4")
+    parser.add_argument("--model", default=None, help="weights (default: testsonar.MODEL_PATH)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--context-frames", type=int, default=30)
+    parser.add_argument("--log-dir", default=None)
+    parser.add_argument("--log-overwrite", action="store_true", help="replace an existing log in --log-dir")
+    parser.add_argument("--track", action="store_true")
+    parser.add_argument("--detect-every", type=int, default=1)
+    parser.add_argument("--compare-single", action="store_true", help="also time a single-process run")
+    args = parser.parse_args()
+
+    kwargs: Dict[str, Any] = {"track": args.track, "detect_every": args.detect_every}
+    if args.model:
+        kwargs["model_path"] = args.model
+    _, result = detect_on_video_sharded(
+        args.input_path, args.out, workers=args.workers, threads_per_worker=args.threads_per_worker,
+        context_frames=args.context_frames, log_dir=args.log_dir, log_overwrite=args.log_overwrite,
+        compare_single=args.compare_single, **kwargs,
+    )
+    print(json.dumps(result, indent=2))
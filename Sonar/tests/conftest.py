@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules import each other by bare name, as when run from their own directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from detection_log import DetectionLog
+
+
+def _fill(log, frames, seed=0, track_ids=True):
+    """Appends random detections for frames; returns the rows as one dict of columns."""
+    rng = np.random.default_rng(seed)
+    rows = {"frame": [], "class_id": [], "track_id": []}
+    for frame in frames:
+        n = int(rng.integers(0, 4))
+        classes = rng.integers(0, 3, n)
+        tracks = rng.integers(0, 5, n) if track_ids else None
+        log.append(frame, rng.random((n, 4)) * 100, rng.random(n), classes, tracks)
+        rows["frame"] += [frame] * n
+        rows["class_id"] += classes.tolist()
+        rows["track_id"] += tracks.tolist() if track_ids else [-1] * n
+    return {k: np.asarray(v) for k, v in rows.items()}
+
+
+def test_query_matches_a_naive_filter(tmp_path):
+    with DetectionLog(str(tmp_path / "log"), fps=10.0, names={0: "fish"}, chunk_frames=4) as log:
+        rows = _fill(log, range(0, 50, 1))
+    assert len(log.index["chunks"]) > 5
+
+    for start, end in [(None, None), (0.0, 1.0), (1.25, 3.35), (4.9, None), (None, 0.05), (10.0, 20.0)]:
+        got = log.query(start_s=start, end_s=end)
+        t = rows["frame"] / 10.0
+        keep = np.ones(len(t), bool)
+        if start is not None:
+            keep &= t >= start
+        if end is not None:
+            keep &= t < end
+        assert got["frame"].tolist() == rows["frame"][keep].tolist()
+
+    got = log.query(start_frame=7, end_frame=23, class_id=1)
+    keep = (rows["frame"] >= 7) & (rows["frame"] < 23) & (rows["class_id"] == 1)
+    assert got["frame"].tolist() == rows["frame"][keep].tolist()
+    assert set(got["class_id"].tolist()) <= {1}
+
+    summary = log.summary()
+    assert summary["detections"] == len(rows["frame"])
+    assert sum(summary["counts_by_class"].values()) == len(rows["frame"])
+
+
+def test_reopen_continues_and_rejects_old_frames(tmp_path):
+    directory = str(tmp_path / "log")
+    with DetectionLog(directory, fps=10.0, chunk_frames=4) as log:
+        _fill(log, range(10))
+    reopened = DetectionLog(directory)
+    assert reopened.fps == 10.0
+    assert DetectionLog.last_logged_frame(directory) == 9
+    with pytest.raises(ValueError):
+        reopened.append(9, np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+    reopened.append(10, np.zeros((1, 4)), np.ones(1), np.zeros(1))
+    reopened.close()
+    assert DetectionLog(directory).query(start_frame=10)["frame"].tolist() == [10]
+
+
+def test_absorb_appends_shards_and_offsets_track_ids(tmp_path):
+    shards = []
+    for i, frames in enumerate([range(0, 12), range(12, 25)]):
+        with DetectionLog(str(tmp_path / f"shard{i}"), fps=10.0, names={0: "fish"}, chunk_frames=5) as shard:
+            shards.append(_fill(shard, frames, seed=i))
+
+    merged = DetectionLog(str(tmp_path / "merged"))
+    merged.absorb(str(tmp_path / "shard0"))
+    merged.absorb(str(tmp_path / "shard1"), track_id_offset=100, move=True)
+
+    got = merged.query()
+    assert got["frame"].tolist() == np.concatenate([shards[0]["frame"], shards[1]["frame"]]).tolist()
+    expected_tracks = np.concatenate([shards[0]["track_id"], shards[1]["track_id"] + 100])
+    assert got["track_id"].tolist() == expected_tracks.tolist()
+    assert merged.fps == 10.0 and merged.names == {0: "fish"}
+
+    with pytest.raises(ValueError):
+        merged.absorb(str(tmp_path / "shard0"))
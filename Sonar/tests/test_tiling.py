@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from tiling import merge_nms, tile_grid
+
+
+def _covered(tiles, height, width):
+    mask = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        mask[y0:y1, x0:x1] = True
+    return mask
+
+
+@pytest.mark.parametrize("height, width, tile, overlap", [
+    (480, 640, 640, 0.2),
+    (1080, 1920, 640, 0.2),
+    (1000, 3000, 512, 0.35),
+    (700, 701, 256, 0.0),
+])
+def test_tile_grid_covers_the_frame_within_bounds(height, width, tile, overlap):
+    tiles = tile_grid(height, width, tile=tile, overlap=overlap)
+    assert _covered(tiles, height, width).all()
+    assert (tiles[:, :2] >= 0).all() and (tiles[:, 2] <= width).all() and (tiles[:, 3] <= height).all()
+    assert ((tiles[:, 2:] - tiles[:, :2]) <= tile).all()
+
+    # Horizontal neighbours in a row overlap by at least `overlap` of a tile
+    for y in np.unique(tiles[:, 1]):
+        row = tiles[tiles[:, 1] == y]
+        row = row[np.argsort(row[:, 0])]
+        assert (row[:-1, 2] - row[1:, 0] >= np.floor(overlap * tile)).all()
+
+
+def test_tile_grid_covers_only_the_roi():
+    roi = (100, 50, 1300, 900)
+    tiles = tile_grid(1080, 1920, tile=640, roi=roi)
+    mask = _covered(tiles, 1080, 1920)
+    assert mask[50:900, 100:1300].all()
+    mask[50:900, 100:1300] = False
+    assert not mask.any()
+
+
+def test_tile_grid_clips_the_roi_and_rejects_empty_ones():
+    tiles = tile_grid(480, 640, tile=640, roi=(-20, -20, 800, 800))
+    assert tiles.tolist() == [[0, 0, 640, 480]]
+    with pytest.raises(ValueError):
+        tile_grid(480, 640, roi=(100, 100, 100, 200))
+    with pytest.raises(ValueError):
+        tile_grid(480, 640, roi=(700, 0, 800, 100))
+
+
+def test_merge_nms_merges_split_boxes_into_their_union():
+    boxes = np.array([
+        [0, 0, 60, 40],     # left half of a fish cut by a seam
+        [50, 0, 100, 40],   # right half, lower score
+        [52, 2, 98, 38],    # same fish seen by a third tile
+        [50, 0, 100, 40],   # same place, other class
+        [300, 300, 340, 330],
+    ], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5, 0.7, 0.4], dtype=np.float32)
+    classes = np.array([0, 0, 0, 1, 0])
+
+    out_boxes, out_scores, out_classes = merge_nms(boxes, scores, classes, threshold=0.5, metric="ios")
+    # The left half only overlaps the right by 10/50 of the smaller box, so it stays separate;
+    # the third tile's box sits inside the right half and is merged into it
+    assert out_scores.tolist() == pytest.approx([0.9, 0.7, 0.6, 0.4])
+    assert out_classes.tolist() == [0, 1, 0, 0]
+    assert out_boxes.tolist() == [[50, 0, 100, 40], [50, 0, 100, 40], [0, 0, 60, 40], [300, 300, 340, 330]]
+
+
+def test_merge_nms_grows_the_top_box_over_everything_it_suppresses():
+    boxes = np.array([[10, 10, 50, 50], [0, 5, 45, 48], [15, 12, 60, 55]], dtype=np.float32)
+    scores = np.array([0.8, 0.3, 0.5], dtype=np.float32)
+    out_boxes, out_scores, out_classes = merge_nms(boxes, scores, np.zeros(3), threshold=0.5)
+    assert out_boxes.tolist() == [[0, 5, 60, 55]]
+    assert out_scores.tolist() == pytest.approx([0.8])
+    assert out_classes.tolist() == [0]
+
+
+def test_merge_nms_handles_empty_input():
+    out_boxes, out_scores, out_classes = merge_nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+    assert out_boxes.shape == (0, 4) and len(out_scores) == 0 and len(out_classes) == 0
@@ -0,0 +1,74 @@
+import numpy as np
+
+from tracking import IouTracker, iou_matrix
+
+
+def _box(x, y, size=20.0):
+    return [x, y, x + size, y + size]
+
+
+def test_iou_matrix():
+    a = np.array([_box(0, 0, 10)], dtype=np.float32)
+    b = np.array([_box(0, 0, 10), _box(5, 0, 10), _box(50, 50, 10)], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 50 / 150, 0.0]], rtol=1e-6)
+    assert iou_matrix(a, np.zeros((0, 4), np.float32)).shape == (1, 0)
+
+
+def test_moving_object_keeps_its_id_between_detections():
+    tracker = IouTracker()
+    for frame in range(30):
+        box = _box(10 + 3 * frame, 40)
+        if frame % 3 == 0:
+            tracker.update([box], [0.9], [0])
+        else:
+            tracker.predict()
+        tracks = tracker.active()
+        assert tracks["track_id"].tolist() == [0]
+    assert tracker.unique_tracks == 1
+    # Velocity learned from the detections carries the box along between them
+    np.testing.assert_allclose(tracker.active()["bbox"][0], _box(10 + 3 * 29, 40), atol=1e-3)
+
+
+def test_crossing_objects_keep_their_ids():
+    tracker = IouTracker()
+    for frame in range(20):
+        left = _box(10 + 4 * frame, 50)
+        right = _box(90 - 4 * frame, 50)
+        tracker.update([left, right], [0.9, 0.8], [0, 1])
+        tracks = tracker.active()
+        by_class = dict(zip(tracks["class_id"].tolist(), tracks["track_id"].tolist()))
+        assert by_class == {0: 0, 1: 1}
+    assert tracker.unique_tracks == 2
+
+
+def test_lost_track_is_dropped_and_a_new_id_issued():
+    tracker = IouTracker(max_missed=2)
+    tracker.update([_box(0, 0)], [0.9], [0])
+    for _ in range(3):
+        tracker.update([], [], [])
+    assert len(tracker.active()["track_id"]) == 0
+
+    tracker.update([_box(0, 0)], [0.9], [0])
+    assert tracker.active()["track_id"].tolist() == [1]
+
+
+def test_predict_decays_confidence():
+    tracker = IouTracker(conf_decay=0.5)
+    tracker.update([_box(0, 0)], [0.8], [0])
+    tracker.predict()
+    tracker.predict()
+    assert abs(tracker.min_confidence() - 0.2) < 1e-6
+
+
+def test_confidence_ratio_is_relative_to_the_detection():
+    tracker = IouTracker(conf_decay=0.9)
+    tracker.update([_box(0, 0), _box(100, 100)], [0.9, 0.26], [0, 0])
+    assert tracker.min_confidence_ratio() == 1.0
+    tracker.predict()
+    tracker.predict()
+    assert abs(tracker.min_confidence_ratio() - 0.81) < 1e-6
+
+    # A fresh detection resets the ratio for the matched track only
+    tracker.update([_box(0, 0)], [0.5], [0])
+    ratios = tracker.confidences / tracker.detected_confidences
+    assert abs(ratios[0] - 1.0) < 1e-6 and abs(ratios[1] - 0.729) < 1e-6
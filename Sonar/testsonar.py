@@ -1,10 +1,33 @@
 from ultralytics import YOLO
 import cv2
+import numpy as np
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 
+try:
+    from detection_log import DetectionLog
+    from hyper_stream import HyperImageStream
+    from motion_gate import MotionGate
+    from tiling import merge_nms, tile_grid
+    from tracking import IouTracker
+except ImportError:
+    # Imported as Sonar.testsonar (e.g. from llm_backbone/server.py)
+    from .detection_log import DetectionLog
+    from .hyper_stream import HyperImageStream
+    from .motion_gate import MotionGate
+    from .tiling import merge_nms, tile_grid
+    from .tracking import IouTracker
+
 MODEL_PATH = "FineTunedSonar.pt"
 
+# Upper bound on the parameter memory of cached detectors (see DetectorCache)
+DETECTOR_CACHE_BUDGET_MB = float(os.environ.get("SONAR_DETECTOR_CACHE_MB", "1024"))
+
 
 def _auto_device() -> Optional[int]:
     """Return a device index for CUDA if available, otherwise None to use CPU. On Apple silicon with MPS, YOLO will select automatically."""
@@ -18,6 +41,197 @@ def _auto_device() -> Optional[int]:
     return None
 
 
+def _model_nbytes(model: YOLO) -> int:
+    """Approximate memory held by a detector's parameters and buffers."""
+    try:
+        net = model.model
+        tensors = list(net.parameters()) + list(net.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+
+class SharedDetector:
+    """
+    A YOLO detector shared between threads. Ultralytics predictors keep
+    per-call state, so predict() and track() are serialised on a per-detector
+    lock; other attributes (names, model, ...) pass through to the YOLO object.
+    """
+
+    def __init__(self, model: YOLO):
+        self.yolo = model
+        self.lock = threading.Lock()
+
+    def predict(self, *args: Any, **kwargs: Any) -> List[Any]:
+        with self.lock:
+            return self.yolo.predict(*args, **kwargs)
+
+    def track(self, *args: Any, **kwargs: Any) -> List[Any]:
+        with self.lock:
+            return self.yolo.track(*args, **kwargs)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> List[Any]:
+        return self.predict(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.yolo, name)
+
+
+class DetectorCache:
+    """
+    LRU cache of loaded, fused and warmed-up YOLO detectors.
+
+    Keyed by (absolute weights path, device, imgsz). When the summed parameter
+    memory of cached detectors exceeds budget_mb, least-recently-used entries
+    are evicted (the most recent one is always kept). Detectors are loaded
+    outside the cache lock, so a cold load only blocks callers of the same key.
+    """
+
+    def __init__(self, budget_mb: float = DETECTOR_CACHE_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple[str, Optional[int], int], Tuple[SharedDetector, int]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, Optional[int], int], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Tuple[str, Optional[int], int]) -> Optional[SharedDetector]:
+        # Caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get(self, model_path: str = MODEL_PATH, device: Optional[int] = None, imgsz: int = 640) -> SharedDetector:
+        key = (os.path.abspath(model_path), device, imgsz)
+        with self._lock:
+            detector = self._lookup(key)
+            if detector is not None:
+                return detector
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Another thread may have loaded it while we waited
+                detector = self._lookup(key)
+                if detector is not None:
+                    return detector
+                self.misses += 1
+
+            model = YOLO(model_path)
+            # Warm-up: the first predict builds the predictor, fuses layers and sets up the device
+            dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+            model.predict(source=dummy, device=device, imgsz=imgsz, verbose=False)
+            detector = SharedDetector(model)
+            nbytes = _model_nbytes(model)
+
+            with self._lock:
+                self._entries[key] = (detector, nbytes)
+                self._loading.pop(key, None)
+                self._evict()
+            return detector
+
+    def _evict(self) -> None:
+        total = sum(nbytes for _, nbytes in self._entries.values())
+        while total > self.budget_bytes and len(self._entries) > 1:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            total -= nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": [
+                    {"model_path": k[0], "device": k[1], "imgsz": k[2], "mb": n / (1024 * 1024)}
+                    for k, (_, n) in self._entries.items()
+                ],
+                "budget_mb": self.budget_bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+detector_cache = DetectorCache()
+
+
+def get_detector(model_path: str = MODEL_PATH, device: Optional[int] = None, imgsz: int = 640) -> SharedDetector:
+    """
+    Returns a cached detector for (model_path, device, imgsz), loading it on first use.
+    It is shared by every caller; its predict() is serialised so concurrent requests are safe.
+    """
+    return detector_cache.get(model_path, device, imgsz)
+
+
+def _result_arrays(r) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(xyxy float32 (N, 4), confidence float32 (N,), class_id int64 (N,)) from one YOLO result."""
+    if r.boxes is None or len(r.boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+    return (
+        r.boxes.xyxy.cpu().numpy().astype(np.float32),
+        r.boxes.conf.cpu().numpy().astype(np.float32),
+        r.boxes.cls.cpu().numpy().astype(np.int64),
+    )
+
+
+class Detections:
+    """
+    Columnar detections for one image: bbox (N, 4) xyxy float32, confidence
+    (N,) float32 and class_id (N,) int64 NumPy arrays, plus the class names.
+
+    Behaves like the list-of-dicts returned before ({class_id, class_name,
+    confidence, bbox}); that list is only built on first indexing/iteration
+    (or via to_list()), so callers that work on the arrays never pay for it.
+    """
+
+    def __init__(self, bbox: np.ndarray, confidence: np.ndarray, class_id: np.ndarray, names: Dict[int, str]):
+        self.bbox = bbox
+        self.confidence = confidence
+        self.class_id = class_id
+        self.names = names
+        self._list: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def from_result(cls, r) -> "Detections":
+        return cls(*_result_arrays(r), r.names if hasattr(r, "names") else {})
+
+    def __len__(self) -> int:
+        return len(self.class_id)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        if self._list is None:
+            names = self.names
+            self._list = [
+                {
+                    "class_id": cls_id,
+                    "class_name": names.get(cls_id, str(cls_id)),
+                    "confidence": conf_v,
+                    "bbox": box,
+                }
+                for box, conf_v, cls_id in zip(
+                    self.bbox.tolist(), self.confidence.tolist(), self.class_id.tolist()
+                )
+            ]
+        return self._list
+
+    def __getitem__(self, index):
+        return self.to_list()[index]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def counts_by_class(self) -> Dict[str, int]:
+        ids, counts = np.unique(self.class_id, return_counts=True)
+        return {self.names.get(i, str(i)): c for i, c in zip(ids.tolist(), counts.tolist())}
+
+
 def detect_on_image(
     image_path: str,
     model_path: str = MODEL_PATH,
@@ -25,44 +239,54 @@ def detect_on_image(
     conf: float = 0.25,
     device: Optional[int] = None,
     save_annotated_to: Optional[str] = None,
-) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    columnar: bool = False,
+    tile: Optional[int] = None,
+    tile_overlap: float = 0.2,
+    roi: Optional[Tuple[int, int, int, int]] = None,
+    tile_full_frame: Optional[bool] = None,
+) -> Tuple[Any, Optional[str]]:
     """
     Runs YOLO detection on a single image and returns structured detections.
 
+    tile=N runs the detector on overlapping N x N crops at native resolution
+    (see _predict_tiled) instead of shrinking the whole frame to imgsz, so
+    small distant fish survive; roi=(x0, y0, x1, y1) limits the tiles to the
+    water column. tile_full_frame adds a pass over the whole frame (the roi,
+    if given) for fish larger than a tile; it defaults to on without an roi
+    and off with one, so an roi keeps its compute saving.
+
     Returns (detections, annotated_image_path)
-    - detections: list of {class_name, confidence, bbox[x1,y1,x2,y2]}
+    - detections: list of {class_name, confidence, bbox[x1,y1,x2,y2]}, or a
+      Detections object (NumPy columns, list view built lazily) if columnar is set
     - annotated_image_path: path to saved annotated image if requested
     """
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
 
-    model = YOLO(model_path)
     device_index = device if device is not None else _auto_device()
+    if tile is not None:
+        model = get_detector(model_path, device_index, tile)
+        image = cv2.imread(image_path)
+        if image is None:
+            raise FileNotFoundError(f"Image not found or unreadable: {image_path}")
+        detections = _predict_tiled(
+            model, image, device_index, conf, tile, tile_overlap, roi, tile_full_frame
+        )
+        annotated_path = None
+        if save_annotated_to:
+            os.makedirs(os.path.dirname(save_annotated_to), exist_ok=True)
+            cv2.imwrite(save_annotated_to, _draw_detections(image, detections))
+            annotated_path = save_annotated_to
+        return (detections if columnar else detections.to_list()), annotated_path
+
+    model = get_detector(model_path, device_index, imgsz)
     results = model.predict(
         source=image_path, device=device_index, imgsz=imgsz, conf=conf, verbose=False
     )
     r0 = results[0]
 
-    detections: List[Dict[str, Any]] = []
-    names = r0.names if hasattr(r0, "names") else {}
-
-    if r0.boxes is not None:
-        for box in r0.boxes:
-            cls_id = int(box.cls.item()) if hasattr(box.cls, "item") else int(box.cls)
-            conf_v = (
-                float(box.conf.item()) if hasattr(box.conf, "item") else float(box.conf)
-            )
-            xyxy = (
-                box.xyxy[0].tolist() if hasattr(box.xyxy, "tolist") else list(box.xyxy)
-            )
-            detections.append(
-                {
-                    "class_id": cls_id,
-                    "class_name": names.get(cls_id, str(cls_id)),
-                    "confidence": conf_v,
-                    "bbox": [float(x) for x in xyxy],
-                }
-            )
+    # One device-to-host transfer per field instead of per-box .item() calls
+    detections = Detections.from_result(r0)
 
     annotated_path: Optional[str] = None
     if save_annotated_to:
@@ -71,7 +295,322 @@ def detect_on_image(
         cv2.imwrite(save_annotated_to, annotated)
         annotated_path = save_annotated_to
 
-    return detections, annotated_path
+    return (detections if columnar else detections.to_list()), annotated_path
+
+
+def _predict_tiled(
+    model: YOLO,
+    image: np.ndarray,
+    device_index: Optional[int],
+    conf: float,
+    tile: int,
+    overlap: float = 0.2,
+    roi: Optional[Tuple[int, int, int, int]] = None,
+    full_frame: Optional[bool] = None,
+    nms_threshold: float = 0.5,
+) -> Detections:
+    """
+    Cuts image into overlapping tile x tile windows (only inside roi, if
+    given), runs them through the detector as one batch together with the
+    whole frame, or just the roi (if full_frame, to keep fish larger than a
+    tile; default: only without an roi), shifts each window's boxes back to
+    frame coordinates and merges duplicates from the overlaps with
+    class-aware merge_nms.
+    """
+    h, w = image.shape[:2]
+    windows = tile_grid(h, w, tile, overlap, roi)
+    crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows.tolist()]
+    offsets = windows[:, [0, 1, 0, 1]].astype(np.float32)
+    if full_frame is None:
+        full_frame = roi is None
+    if full_frame:
+        # The union of the tiles is the (clipped) roi, or the whole frame without one
+        x0, y0 = windows[:, :2].min(axis=0).tolist()
+        x1, y1 = windows[:, 2:].max(axis=0).tolist()
+        crops.append(image[y0:y1, x0:x1])
+        offsets = np.concatenate([offsets, np.array([[x0, y0, x0, y0]], np.float32)])
+
+    results = model.predict(source=crops, device=device_index, imgsz=tile, conf=conf, verbose=False)
+    boxes, confs, cls_ids = [], [], []
+    for r, offset in zip(results, offsets):
+        xyxy, c, k = _result_arrays(r)
+        boxes.append(xyxy + offset)
+        confs.append(c)
+        cls_ids.append(k)
+    merged = merge_nms(np.concatenate(boxes), np.concatenate(confs), np.concatenate(cls_ids), nms_threshold)
+    return Detections(*merged, names=results[0].names if results else {})
+
+
+def _draw_detections(image: np.ndarray, detections: Detections) -> np.ndarray:
+    """Draws '<class> <conf>' labelled boxes on a copy of image."""
+    annotated = image.copy()
+    for box, conf_v, cls_id in zip(
+        detections.bbox.tolist(), detections.confidence.tolist(), detections.class_id.tolist()
+    ):
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{detections.names.get(cls_id, str(cls_id))} {conf_v:.2f}"
+        cv2.putText(annotated, label, (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return annotated
+
+
+def _load_image(image_path: str) -> Optional[np.ndarray]:
+    # None for a missing or unreadable file; detect_on_images skips it instead of failing the batch
+    return cv2.imread(image_path)
+
+
+def detect_on_images(
+    image_paths: List[str],
+    batch_size: int = 8,
+    model_path: str = MODEL_PATH,
+    imgsz: int = 640,
+    conf: float = 0.25,
+    device: Optional[int] = None,
+    num_workers: int = 4,
+    prefetch_batches: int = 2,
+    columnar: bool = False,
+    return_stats: bool = False,
+):
+    """
+    Runs YOLO detection on many images, batch_size images per forward pass.
+
+    Background threads decode the next prefetch_batches batches while the
+    current batch is on the detector. Images are passed to ultralytics as
+    decoded, one predict per distinct image size in a batch, so they get the
+    same letterboxing (and the same detections) as detect_on_image.
+
+    Returns a list with one detections list per image (same dicts as
+    detect_on_image, or Detections objects if columnar is set), or
+    (detections_per_image, stats) if return_stats is set, where stats has
+    images, seconds, images_per_sec and failed. Missing or unreadable images
+    are skipped: their entry is None and their path is listed in failed.
+    """
+    device_index = device if device is not None else _auto_device()
+    model = get_detector(model_path, device_index, imgsz)
+
+    start = time.perf_counter()
+    all_detections: List[Any] = []
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="sonar-decode") as pool:
+        pending = deque()
+        next_index = 0
+
+        def _fill():
+            nonlocal next_index
+            limit = (prefetch_batches + 1) * batch_size
+            while next_index < len(image_paths) and len(pending) < limit:
+                pending.append((image_paths[next_index], pool.submit(_load_image, image_paths[next_index])))
+                next_index += 1
+
+        _fill()
+        while pending:
+            batch = [(path, future.result()) for path, future in
+                     (pending.popleft() for _ in range(min(batch_size, len(pending))))]
+            _fill()
+
+            # Ultralytics pads a mixed-size batch to a square, so group by size to keep
+            # the minimal letterbox a single image gets
+            by_shape: Dict[Tuple[int, ...], List[int]] = {}
+            for i, (path, image) in enumerate(batch):
+                if image is None:
+                    print(f"Warning: Failed to load image {path}. Skipping.")
+                    failed.append(path)
+                else:
+                    by_shape.setdefault(image.shape, []).append(i)
+
+            batch_detections: List[Any] = [None] * len(batch)
+            for indices in by_shape.values():
+                results = model.predict(
+                    source=[batch[i][1] for i in indices], device=device_index, imgsz=imgsz, conf=conf, verbose=False
+                )
+                for i, r in zip(indices, results):
+                    detections = Detections.from_result(r)
+                    batch_detections[i] = detections if columnar else detections.to_list()
+            all_detections.extend(batch_detections)
+
+    elapsed = time.perf_counter() - start
+    if not return_stats:
+        return all_detections
+    stats = {
+        "images": len(image_paths),
+        "seconds": elapsed,
+        "images_per_sec": len(image_paths) / elapsed if elapsed > 0 else None,
+        "failed": failed,
+    }
+    return all_detections, stats
+
+
+def _draw_tracks(frame: np.ndarray, tracks: Dict[str, np.ndarray], names: Dict[int, str]) -> np.ndarray:
+    """Draws tracked boxes labelled '<class> #<track id> <conf>' on a copy of frame."""
+    annotated = frame.copy()
+    for box, conf_v, cls_id, track_id in zip(
+        tracks["bbox"].tolist(), tracks["confidence"].tolist(),
+        tracks["class_id"].tolist(), tracks["track_id"].tolist(),
+    ):
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{names.get(cls_id, str(cls_id))} #{track_id} {conf_v:.2f}"
+        cv2.putText(annotated, label, (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return annotated
+
+
+_END = object()  # end-of-stream marker between pipeline stages
+
+
+def _pipeline_put(q: "queue.Queue", item: Any, stop: threading.Event) -> float:
+    """Blocking put that gives up once stop is set; returns seconds spent blocked."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    return time.perf_counter() - start
+
+
+def _pipeline_get(q: "queue.Queue", stop: threading.Event) -> Tuple[Any, float]:
+    """Blocking get that returns _END once stop is set; returns (item, seconds spent blocked)."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1), time.perf_counter() - start
+        except queue.Empty:
+            continue
+    return _END, time.perf_counter() - start
+
+
+def _run_video_pipeline(cap, writer, process_frame, queue_size: int, finish=None) -> Dict[str, Any]:
+    """
+    decoder thread -> [frames queue] -> process_frame (this thread) -> [annotated queue] -> encoder thread
+
+    Both queues are bounded by queue_size, so a slow stage back-pressures the
+    others instead of buffering the whole video. process_frame may return None
+    to write nothing for a frame; finish(), if given, returns the frames still
+    to be written once decoding ends. Returns per-stage busy and stalled
+    seconds plus end-to-end fps.
+    """
+    frames_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    annotated_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    stats = {
+        "decode_s": 0.0, "decode_stall_s": 0.0,
+        "infer_s": 0.0, "infer_wait_input_s": 0.0, "infer_wait_output_s": 0.0,
+        "encode_s": 0.0, "encode_stall_s": 0.0,
+    }
+
+    def decoder():
+        try:
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                stats["decode_s"] += time.perf_counter() - t0
+                if not ok:
+                    break
+                stats["decode_stall_s"] += _pipeline_put(frames_q, frame, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _pipeline_put(frames_q, _END, stop)
+
+    def encoder():
+        try:
+            while True:
+                item, waited = _pipeline_get(annotated_q, stop)
+                stats["encode_stall_s"] += waited
+                if item is _END:
+                    break
+                t0 = time.perf_counter()
+                writer.write(item)
+                stats["encode_s"] += time.perf_counter() - t0
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=decoder, name="sonar-decode", daemon=True),
+        threading.Thread(target=encoder, name="sonar-encode", daemon=True),
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    frames = 0
+    try:
+        while True:
+            frame, waited = _pipeline_get(frames_q, stop)
+            stats["infer_wait_input_s"] += waited
+            if frame is _END:
+                break
+            t0 = time.perf_counter()
+            annotated = process_frame(frames, frame)
+            stats["infer_s"] += time.perf_counter() - t0
+            if annotated is not None:
+                stats["infer_wait_output_s"] += _pipeline_put(annotated_q, annotated, stop)
+            frames += 1
+        if finish is not None and not stop.is_set():
+            t0 = time.perf_counter()
+            trailing = finish()
+            stats["infer_s"] += time.perf_counter() - t0
+            for annotated in trailing:
+                stats["infer_wait_output_s"] += _pipeline_put(annotated_q, annotated, stop)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        _pipeline_put(annotated_q, _END, stop)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    elapsed = time.perf_counter() - start
+    stats.update(frames=frames, seconds=elapsed, fps=frames / elapsed if elapsed > 0 else None)
+    return stats
+
+
+class _FrameRange:
+    """Wraps a cv2.VideoCapture so read() stops after `count` frames."""
+
+    def __init__(self, cap, count: int):
+        self.cap = cap
+        self.remaining = count
+
+    def read(self):
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        return self.cap.read()
+
+    def get(self, prop: int) -> float:
+        return self.cap.get(prop)
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+def _seek(cap, input_path: str, frame: int):
+    """
+    Positions cap so its next read() returns frame `frame`; returns the capture to use.
+    cap.set(CAP_PROP_POS_FRAMES) is not frame-accurate for every codec, so the frame
+    before is read and its timestamp checked. On a mismatch the video is reopened and
+    decoded up to `frame` with grab(), which is exact but slower.
+    """
+    if frame <= 0:
+        return cap
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame - 1)
+    ok, _ = cap.read()
+    if ok and fps > 0 and abs(cap.get(cv2.CAP_PROP_POS_MSEC) - (frame - 1) * 1000.0 / fps) < 500.0 / fps:
+        return cap
+    cap.release()
+    cap = cv2.VideoCapture(input_path)
+    for _ in range(frame):
+        if not cap.grab():
+            break
+    return cap
 
 
 def detect_on_video(
@@ -81,43 +620,216 @@ def detect_on_video(
     imgsz: int = 640,
     conf: float = 0.25,
     device: Optional[int] = None,
-) -> str:
+    headless: bool = False,
+    queue_size: int = 8,
+    detect_every: int = 1,
+    track: bool = False,
+    min_track_conf_ratio: float = 0.5,
+    motion_gate: Any = None,
+    log_dir: Optional[str] = None,
+    log_overwrite: bool = False,
+    hyper_mode: Optional[str] = None,
+    hyper_n: int = 3,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None,
+    context_frames: int = 0,
+    fourcc: str = "mp4v",
+    return_stats: bool = False,
+):
+    """
+    Runs YOLO on the frames of input_path and writes an annotated video.
+
+    headless=True skips the preview window and overlaps decoding, inference
+    and encoding in separate threads joined by bounded queues of queue_size
+    frames. The stage timings and end-to-end fps are printed, and returned as
+    (output_path, stats) when return_stats is set.
+
+    detect_every=k (k > 1) or track=True enables IoU tracking: the detector
+    runs every k frames, or sooner once any track's confidence has decayed
+    below min_track_conf_ratio of the confidence it was detected with (so
+    low-confidence detections do not force a run on every frame), and boxes
+    are propagated by the tracker in between.
+    Boxes carry persistent track IDs; stats report detector runs and the number
+    of unique tracks (fish) seen.
+
+    motion_gate=True (or a configured MotionGate) skips the detector on frames
+    whose downscaled frame-difference energy is below the gate's adaptive
+    threshold and reuses the last detections. The gate is only consulted on
+    frames the tracker scheduled, so both the fraction of those (gated) frames
+    and of all processed frames that it skipped are logged.
+
+    log_dir persists every frame's detections (frame, time, class, confidence,
+    bbox, track id) to a DetectionLog there, for later time-range queries. An
+    existing log there is appended to if it ends before start_frame, replaced
+    if log_overwrite is set, and otherwise rejected before any frame is read.
+
+    hyper_mode='diff' or 'stack' feeds the detector the centered hyper-image
+    of hyper_n frames (see HyperImageStream), as the hyper-image weights were
+    trained on, and draws the boxes on the raw center frame. Output frames lag
+    decoding by hyper_n // 2 frames; the video keeps every frame.
+
+    start_frame / end_frame restrict the output (video and log) to frames in
+    [start_frame, end_frame). context_frames more frames on either side are
+    still decoded and processed, so tracker, motion-gate and hyper-image state
+    at the range edges match a run over the whole video (see sharded_video).
+    The start is located frame-accurately (see _seek); stats report
+    written_frames. fourcc selects the output codec (e.g. 'FFV1' for a
+    lossless .avi).
+    """
+    if detect_every < 1:
+        raise ValueError(f"detect_every must be >= 1, got {detect_every}")
+    if log_dir:
+        if log_overwrite:
+            DetectionLog.remove(log_dir)
+        elif DetectionLog.last_logged_frame(log_dir) >= start_frame:
+            raise ValueError(
+                f"{log_dir} already logs frames up to {DetectionLog.last_logged_frame(log_dir)}; "
+                "pass log_overwrite=True to replace it, or use a new directory"
+            )
+
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open {input_path}")
+    first = max(0, start_frame - context_frames)
+    cap = _seek(cap, input_path, first)
+    if end_frame is not None:
+        cap = _FrameRange(cap, end_frame + context_frames - first)
 
-    model = YOLO(model_path)
+    device_index = device if device is not None else _auto_device()
+    model = get_detector(model_path, device_index, imgsz)
 
     fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
     w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # type: ignore
-    writer = cv2.VideoWriter(output_path, fourcc, fps, (w, h))
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))  # type: ignore
     if not writer.isOpened():
         raise RuntimeError(
             "VideoWriter failed to open. Try a different fourcc (e.g., 'avc1')."
         )
 
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-        device_index = device if device is not None else _auto_device()
+    tracker = IouTracker() if (track or detect_every > 1) else None
+    gate = MotionGate() if motion_gate is True else (motion_gate or None)
+    counters = {"detector_runs": 0, "annotated_frames": 0, "written_frames": 0}
+    last_result = None
+    log = DetectionLog(log_dir, fps=fps, names=model.names) if log_dir else None
+    hyper = HyperImageStream(hyper_mode, hyper_n) if hyper_mode else None
+
+    def in_range(frame_index: int) -> bool:
+        return frame_index >= start_frame and (end_frame is None or frame_index < end_frame)
+
+    def log_frame(frame_index: int, arrays: Tuple[np.ndarray, ...]) -> None:
+        if log is not None and in_range(frame_index):
+            log.append(frame_index, *arrays)
+
+    def annotate(frame_index: int, frame: np.ndarray, source: np.ndarray) -> np.ndarray:
+        nonlocal last_result
+        counters["annotated_frames"] += 1
+        scheduled = (
+            tracker is None
+            or frame_index % detect_every == 0
+            or tracker.min_confidence_ratio() < min_track_conf_ratio
+        )
+        if scheduled and gate is not None and not gate.should_detect(frame):
+            scheduled = False
+
+        if not scheduled:
+            if tracker is not None:
+                tracker.predict()
+                tracks = tracker.active()
+                log_frame(frame_index, (tracks["bbox"], tracks["confidence"], tracks["class_id"], tracks["track_id"]))
+                return _draw_tracks(frame, tracks, model.names)
+            if last_result is None:
+                log_frame(frame_index, (np.zeros((0, 4)), np.zeros(0), np.zeros(0)))
+                return frame
+            log_frame(frame_index, _result_arrays(last_result))
+            return last_result.plot(img=frame.copy())
+
         results = model.predict(
-            source=frame, device=device_index, imgsz=imgsz, conf=conf, verbose=False
+            source=source, device=device_index, imgsz=imgsz, conf=conf, verbose=False
         )
-        annotated = results[0].plot()
-        writer.write(annotated)
+        counters["detector_runs"] += 1
+        last_result = results[0]
+        if tracker is None:
+            log_frame(frame_index, _result_arrays(results[0]))
+            return results[0].plot(img=frame.copy()) if hyper is not None else results[0].plot()
+        tracker.update(*_result_arrays(results[0]))
+        tracks = tracker.active()
+        log_frame(frame_index, (tracks["bbox"], tracks["confidence"], tracks["class_id"], tracks["track_id"]))
+        return _draw_tracks(frame, tracks, model.names)
 
-        cv2.imshow("Fish detector", annotated)
-        if cv2.waitKey(33) & 0xFF == 27:
-            break
+    def emit(frame_index: int, frame: np.ndarray, source: np.ndarray) -> Optional[np.ndarray]:
+        annotated = annotate(frame_index, frame, source)
+        if not in_range(frame_index):
+            return None
+        counters["written_frames"] += 1
+        return annotated
 
-    cap.release()
-    writer.release()
-    cv2.destroyAllWindows()
-    return output_path
+    def process_frame(frame_index: int, frame: np.ndarray) -> Optional[np.ndarray]:
+        # frame_index counts decoded frames; shift it to the position in the video
+        if hyper is None:
+            return emit(first + frame_index, frame, frame)
+        emitted = hyper.push(frame)
+        if emitted is None:
+            return None
+        index, raw, source = emitted
+        return emit(first + index, raw, source)
+
+    def finish() -> List[np.ndarray]:
+        if hyper is None:
+            return []
+        trailing = (emit(first + index, raw, source) for index, raw, source in hyper.flush())
+        return [annotated for annotated in trailing if annotated is not None]
+
+    stats: Dict[str, Any] = {}
+    try:
+        if headless:
+            stats = _run_video_pipeline(cap, writer, process_frame, queue_size, finish)
+            print(
+                f"[video] {stats['frames']} frames in {stats['seconds']:.1f}s ({stats['fps']:.1f} fps); "
+                f"stalled: decode {stats['decode_stall_s']:.2f}s, "
+                f"infer {stats['infer_wait_input_s'] + stats['infer_wait_output_s']:.2f}s, "
+                f"encode {stats['encode_stall_s']:.2f}s"
+            )
+        else:
+            frame_index = 0
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                annotated = process_frame(frame_index, frame)
+                frame_index += 1
+                if annotated is None:
+                    continue
+                writer.write(annotated)
+
+                cv2.imshow("Fish detector", annotated)
+                if cv2.waitKey(33) & 0xFF == 27:
+                    break
+            for annotated in finish():
+                writer.write(annotated)
+    finally:
+        cap.release()
+        writer.release()
+        if log is not None:
+            log.close()
+        if not headless:
+            cv2.destroyAllWindows()
+
+    stats.update(counters)
+    if tracker is not None:
+        stats["unique_tracks"] = tracker.unique_tracks
+        print(f"[video] detector ran on {counters['detector_runs']} frames; {tracker.unique_tracks} unique tracks")
+    if log is not None:
+        stats["log_dir"] = log_dir
+    if gate is not None:
+        gate_stats = gate.stats()
+        total = counters["annotated_frames"]
+        gate_stats["skip_fraction_of_all"] = gate_stats["skipped"] / total if total else 0.0
+        stats["motion_gate"] = gate_stats
+        print(f"[video] motion gate skipped {gate_stats['skipped']} of {gate_stats['gated_frames']} scheduled detector runs "
+              f"({gate_stats['skip_fraction_of_gated']:.1%}; {gate_stats['skip_fraction_of_all']:.1%} of {total} frames)")
+    return (output_path, stats) if return_stats else output_path
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+import numpy as np
+from typing import Optional, Tuple
+
+try:
+    from tracking import iou_matrix
+except ImportError:
+    from .tracking import iou_matrix
+
+
+def _starts(length: int, tile: int, overlap: float) -> np.ndarray:
+    if length <= tile:
+        return np.zeros(1, dtype=np.int64)
+    step = tile * (1.0 - overlap)
+    count = int(np.ceil((length - tile) / step)) + 1
+    return np.round(np.linspace(0, length - tile, count)).astype(np.int64)
+
+
+def tile_grid(
+    height: int,
+    width: int,
+    tile: int = 640,
+    overlap: float = 0.2,
+    roi: Optional[Tuple[int, int, int, int]] = None,
+) -> np.ndarray:
+    """
+    (K, 4) xyxy pixel windows of at most tile x tile covering roi (default: the
+    whole frame), neighbours overlapping by at least `overlap` of a tile.
+    """
+    x0, y0, x1, y1 = roi if roi is not None else (0, 0, width, height)
+    x0, y0 = max(0, int(x0)), max(0, int(y0))
+    x1, y1 = min(width, int(x1)), min(height, int(y1))
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"Empty region of interest {roi} for a {width}x{height} frame")
+
+    xs = x0 + _starts(x1 - x0, tile, overlap)
+    ys = y0 + _starts(y1 - y0, tile, overlap)
+    gx, gy = np.meshgrid(xs, ys)
+    gx, gy = gx.ravel(), gy.ravel()
+    return np.stack([gx, gy, np.minimum(gx + tile, x1), np.minimum(gy + tile, y1)], axis=1)
+
+
+def _overlap_matrix(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "iou":
+        return iou_matrix(a, b)
+    # Intersection over the smaller box: a fish cut by a tile edge is mostly inside its full box
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(np.minimum(area_a[:, None], area_b[None, :]), 1e-9)
+
+
+def merge_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    classes: np.ndarray,
+    threshold: float = 0.5,
+    metric: str = "ios",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Class-aware greedy NMS that merges instead of discarding: each kept box is
+    grown to the union of the boxes it suppresses, which stitches fish split
+    across tile seams back together.
+
+    Overlap is IoU (metric="iou") or intersection over the smaller box
+    ("ios"). The pairwise overlap matrix is computed once; the greedy pass only
+    indexes into it. Returns (boxes, scores, classes) of the kept detections,
+    highest score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+    if len(boxes) == 0:
+        return boxes, scores, classes
+
+    order = np.argsort(-scores, kind="stable")
+    boxes, scores, classes = boxes[order], scores[order], classes[order]
+    overlaps = _overlap_matrix(boxes, boxes, metric)
+    same = (overlaps >= threshold) & (classes[:, None] == classes[None, :])
+
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= same[i]
+
+    keep = np.asarray(keep, dtype=np.int64)
+    # Each box belongs to the first (highest-scoring) kept box overlapping it, i.e. the one that suppressed it
+    owned = same[keep]
+    owner = np.argmax(owned, axis=0)
+    member = np.zeros_like(owned)
+    member[owner, np.arange(len(boxes))] = True
+    lo = np.where(member[:, :, None], boxes[None, :, :2], np.inf).min(axis=1)
+    hi = np.where(member[:, :, None], boxes[None, :, 2:], -np.inf).max(axis=1)
+    return np.concatenate([lo, hi], axis=1).astype(np.float32), scores[keep], classes[keep]
@@ -0,0 +1,157 @@
+import numpy as np
+from typing import Dict, Tuple
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes, shape (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _centers(boxes: np.ndarray) -> np.ndarray:
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+class IouTracker:
+    """
+    Lightweight multi-object tracker for slowly moving sonar echoes.
+
+    Detections are matched to tracks greedily by IoU, falling back to centroid
+    distance (within centroid_gate box diagonals) for small boxes that moved
+    past each other's outline. Call exactly one of update() (detector ran on
+    this frame) or predict() (it did not) per frame. predict() moves every
+    track by its per-frame velocity and decays its confidence by conf_decay, so
+    callers can trigger a fresh detection once confidence drops too low, in
+    absolute terms (min_confidence) or relative to the confidence the track was
+    last detected with (min_confidence_ratio).
+    Tracks unmatched for more than max_missed detector runs are dropped.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        centroid_gate: float = 0.5,
+        conf_decay: float = 0.95,
+        max_missed: int = 3,
+    ):
+        self.iou_threshold = iou_threshold
+        self.centroid_gate = centroid_gate
+        self.conf_decay = conf_decay
+        self.max_missed = max_missed
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.confidences = np.zeros(0, dtype=np.float32)
+        self.detected_confidences = np.zeros(0, dtype=np.float32)  # confidence at last matched detection
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self._anchor_boxes = np.zeros((0, 4), dtype=np.float32)  # box at last matched detection
+        self._since_anchor = np.zeros(0, dtype=np.int64)  # frames since that detection
+
+        self.next_id = 0
+
+    @property
+    def unique_tracks(self) -> int:
+        """Number of distinct track IDs created so far."""
+        return self.next_id
+
+    def min_confidence(self) -> float:
+        return float(self.confidences.min()) if len(self.confidences) else 1.0
+
+    def min_confidence_ratio(self) -> float:
+        """Smallest current / last-detected confidence over the tracks, i.e. how far the most decayed track has decayed."""
+        if not len(self.confidences):
+            return 1.0
+        return float((self.confidences / np.maximum(self.detected_confidences, 1e-9)).min())
+
+    def predict(self) -> None:
+        """Advances every track by one frame without a detector result."""
+        self.boxes = self.boxes + self.velocity
+        self.confidences = self.confidences * self.conf_decay
+        self._since_anchor = self._since_anchor + 1
+
+    def _match(self, det_boxes: np.ndarray, det_classes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self.boxes) == 0 or len(det_boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        iou = iou_matrix(self.boxes, det_boxes)
+        diag = np.hypot(det_boxes[:, 2] - det_boxes[:, 0], det_boxes[:, 3] - det_boxes[:, 1])
+        dist = np.linalg.norm(_centers(self.boxes)[:, None, :] - _centers(det_boxes)[None, :, :], axis=2)
+        norm_dist = dist / np.maximum(diag[None, :], 1e-9)
+
+        valid = ((iou >= self.iou_threshold) | (norm_dist <= self.centroid_gate))
+        valid &= self.classes[:, None] == det_classes[None, :]
+        affinity = np.where(valid, iou - 0.01 * norm_dist, -np.inf)
+
+        # Greedy assignment: best remaining pair first
+        order = np.argsort(-affinity, axis=None)
+        track_rows, det_cols = np.unravel_index(order, affinity.shape)
+        used_t = np.zeros(len(self.boxes), dtype=bool)
+        used_d = np.zeros(len(det_boxes), dtype=bool)
+        matched_t, matched_d = [], []
+        for t, d in zip(track_rows.tolist(), det_cols.tolist()):
+            if not np.isfinite(affinity[t, d]):
+                break
+            if used_t[t] or used_d[d]:
+                continue
+            used_t[t] = used_d[d] = True
+            matched_t.append(t)
+            matched_d.append(d)
+        return np.asarray(matched_t, dtype=np.int64), np.asarray(matched_d, dtype=np.int64)
+
+    def update(self, det_boxes: np.ndarray, det_confidences: np.ndarray, det_classes: np.ndarray) -> None:
+        """Advances one frame and folds this frame's detector result (xyxy boxes, confidences, class ids) into the tracks."""
+        self.predict()
+        det_boxes = np.asarray(det_boxes, dtype=np.float32).reshape(-1, 4)
+        det_confidences = np.asarray(det_confidences, dtype=np.float32).reshape(-1)
+        det_classes = np.asarray(det_classes, dtype=np.int64).reshape(-1)
+
+        mt, md = self._match(det_boxes, det_classes)
+        if len(mt):
+            steps = np.maximum(self._since_anchor[mt], 1)[:, None]
+            self.velocity[mt] = (det_boxes[md] - self._anchor_boxes[mt]) / steps
+            self.boxes[mt] = det_boxes[md]
+            self._anchor_boxes[mt] = det_boxes[md]
+            self._since_anchor[mt] = 0
+            self.confidences[mt] = det_confidences[md]
+            self.detected_confidences[mt] = det_confidences[md]
+            self.missed[mt] = 0
+
+        unmatched_t = np.ones(len(self.boxes), dtype=bool)
+        unmatched_t[mt] = False
+        self.missed[unmatched_t] += 1
+        keep = self.missed <= self.max_missed
+
+        new_d = np.ones(len(det_boxes), dtype=bool)
+        new_d[md] = False
+        n_new = int(new_d.sum())
+        new_ids = np.arange(self.next_id, self.next_id + n_new, dtype=np.int64)
+        self.next_id += n_new
+
+        self.boxes = np.concatenate([self.boxes[keep], det_boxes[new_d]])
+        self.velocity = np.concatenate([self.velocity[keep], np.zeros((n_new, 4), dtype=np.float32)])
+        self.confidences = np.concatenate([self.confidences[keep], det_confidences[new_d]])
+        self.detected_confidences = np.concatenate([self.detected_confidences[keep], det_confidences[new_d]])
+        self.classes = np.concatenate([self.classes[keep], det_classes[new_d]])
+        self.ids = np.concatenate([self.ids[keep], new_ids])
+        self.missed = np.concatenate([self.missed[keep], np.zeros(n_new, dtype=np.int64)])
+        self._anchor_boxes = np.concatenate([self._anchor_boxes[keep], det_boxes[new_d]])
+        self._since_anchor = np.concatenate([self._since_anchor[keep], np.zeros(n_new, dtype=np.int64)])
+
+    def active(self) -> Dict[str, np.ndarray]:
+        """Current tracks (including ones coasting on missed detections) as arrays."""
+        return {
+            "bbox": self.boxes,
+            "confidence": self.confidences,
+            "class_id": self.classes,
+            "track_id": self.ids,
+        }
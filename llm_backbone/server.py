@@ -41,6 +41,13 @@ except Exception:
     maint_module = None
     get_engine_fault = None
 
+if maint_module is not None and hasattr(maint_module, "get_model"):
+    # Load and warm up the maintenance weights once, not on the first request
+    try:
+        maint_module.get_model()
+    except Exception:
+        pass
+
 app = Flask(__name__)
 if CORS is not None:
     CORS(app)
@@ -241,9 +248,14 @@ def health():
         PROJECT_ROOT, "maintainance_model", "multiclass_model.pt"
     )
 
+    maint_model_stats = None
+    if maint_module is not None and hasattr(maint_module, "registry"):
+        maint_model_stats = maint_module.registry.stats()
+
     return jsonify(
         {
             "status": "ok",
+            "maint_model": maint_model_stats,
             "components": {
                 "llm_loaded": True,
                 "sonar_helper_available": sonar_ok,
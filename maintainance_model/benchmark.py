@@ -0,0 +1,213 @@
+"""
+Benchmarks for maintenance-model inference.
+
+Measures, using rows from engine_data.csv:
+  - cold start: fresh interpreter importing torch, loading the model and scoring one row
+  - per-call latency of get_engine_fault (p50 / p99 / mean)
+  - get_engine_faults throughput as batch size grows from 1 to 65536
+  - throughput vs. torch intra-op thread count
+  - peak RSS of this process and of the cold-start child
+
+Results are written as JSON so runs can be compared over time. With
+--baseline, latency / throughput changes against an earlier result file are
+printed and the exit status is 1 if any metric regressed beyond --tolerance.
+Respects MAINT_BACKEND (torch or numpy) like run_maintainance.
+
+Usage:
+    python benchmark.py [--out bench_results.json] [--baseline old.json] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024, 4096, 16384, 65536]
+
+COLD_START_SNIPPET = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import run_maintainance
+t1 = time.perf_counter()
+model = run_maintainance.get_model()
+t2 = time.perf_counter()
+run_maintainance.get_engine_fault([791.23, 3.30, 4.65, 2.33, 77.64, -78.42], model)
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "load_s": t2 - t1,
+    "first_call_s": t3 - t2,
+    "torch_imported": "torch" in sys.modules,
+    "ru_maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def _rss_mb(ru_maxrss):
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return ru_maxrss / (1024.0 * 1024.0) if sys.platform == "darwin" else ru_maxrss / 1024.0
+
+
+def bench_cold_start(repeats=3):
+    runs = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_START_SNIPPET], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - t0
+        run = json.loads(out.stdout.strip().splitlines()[-1])
+        run["wall_s"] = wall
+        run["peak_rss_mb"] = _rss_mb(run.pop("ru_maxrss"))
+        runs.append(run)
+    best = min(runs, key=lambda r: r["wall_s"])
+    return {k: best[k] for k in ("wall_s", "import_s", "load_s", "first_call_s", "peak_rss_mb", "torch_imported")}
+
+
+def bench_latency(rows, model, calls=2000):
+    import run_maintainance
+
+    n = len(rows)
+    for i in range(50):
+        run_maintainance.get_engine_fault(rows[i % n], model)
+    samples = np.empty(calls)
+    for i in range(calls):
+        t0 = time.perf_counter()
+        run_maintainance.get_engine_fault(rows[i % n], model)
+        samples[i] = time.perf_counter() - t0
+    samples *= 1e6
+    return {
+        "calls": calls,
+        "p50_us": float(np.percentile(samples, 50)),
+        "p99_us": float(np.percentile(samples, 99)),
+        "mean_us": float(samples.mean()),
+    }
+
+
+def _rows_per_sec(batch, model, min_time=0.2):
+    import run_maintainance
+
+    run_maintainance.get_engine_faults(batch, model)
+    iters, elapsed = 0, 0.0
+    t0 = time.perf_counter()
+    while elapsed < min_time:
+        run_maintainance.get_engine_faults(batch, model)
+        iters += 1
+        elapsed = time.perf_counter() - t0
+    return len(batch) * iters / elapsed
+
+
+def bench_throughput(rows, model, batch_sizes=BATCH_SIZES):
+    data = np.resize(rows, (max(batch_sizes), rows.shape[1])).astype(np.float32)
+    return {str(bs): _rows_per_sec(data[:bs], model) for bs in batch_sizes}
+
+
+def bench_threads(rows, model, batch_size=4096):
+    # Only meaningful for the torch backend; never import torch for the numpy one
+    if "torch" not in sys.modules or not hasattr(model, "parameters"):
+        return None
+    import torch
+
+    data = np.resize(rows, (batch_size, rows.shape[1])).astype(np.float32)
+    original = torch.get_num_threads()
+    counts = sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+    results = {}
+    try:
+        for threads in counts:
+            if threads > (os.cpu_count() or 1):
+                continue
+            torch.set_num_threads(threads)
+            results[str(threads)] = _rows_per_sec(data, model)
+    finally:
+        torch.set_num_threads(original)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(csv_path="engine_data.csv", skip_cold_start=False):
+    import run_maintainance
+    from dataset import load_engine_data
+
+    X, _ = load_engine_data(os.path.join(HERE, csv_path))
+    rows = np.asarray(X, dtype=np.float32)
+    model = run_maintainance.get_model()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git_commit(),
+        "backend": run_maintainance.BACKEND,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "rows": len(rows),
+    }
+    if "torch" in sys.modules:
+        results["torch"] = sys.modules["torch"].__version__
+    if not skip_cold_start:
+        results["cold_start"] = bench_cold_start()
+    results["latency"] = bench_latency(rows, model)
+    results["throughput_rows_per_s"] = bench_throughput(rows, model)
+    results["thread_scaling_rows_per_s"] = bench_threads(rows, model)
+    results["peak_rss_mb"] = _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    return results
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Returns a list of (metric, old, new, change) entries that regressed by more than tolerance."""
+    checks = []  # (name, old, new, higher_is_better)
+    for key in ("p50_us", "p99_us"):
+        checks.append((f"latency.{key}", baseline["latency"][key], current["latency"][key], False))
+    for bs, old in baseline.get("throughput_rows_per_s", {}).items():
+        new = current.get("throughput_rows_per_s", {}).get(bs)
+        if new is not None:
+            checks.append((f"throughput[{bs}]", old, new, True))
+    if "cold_start" in baseline and "cold_start" in current:
+        checks.append(("cold_start.wall_s", baseline["cold_start"]["wall_s"], current["cold_start"]["wall_s"], False))
+
+    regressions = []
+    for name, old, new, higher_is_better in checks:
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        print(f"  {name:28s} {old:14.2f} -> {new:14.2f} ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark maintenance-model inference")
+    parser.add_argument("--csv", default="engine_data.csv")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--skip-cold-start", action="store_true")
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    results = run_benchmarks(args.csv, skip_cold_start=args.skip_cold_start)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
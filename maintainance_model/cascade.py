@@ -0,0 +1,237 @@
+"""
+Rule-based fast path in front of MaintananceNN.
+
+A per-channel [lo, hi] envelope is learned from engine_data.csv by box
+peeling: starting from the box around every row, the edge whose removal of a
+small quantile of rows most raises the fraction the full model labels
+"No Issue" is moved in, until that fraction reaches `target_agreement` on
+both a training split and the held-out rows; fitting fails rather than
+return a box that misses the target. At serving time a vectorized range check answers
+"No Issue" for readings inside the envelope; only the remaining rows go
+through the network.
+
+Fast-path rows get the envelope's held-out agreement as their confidence, and
+a probability vector with that mass on "No Issue" and the rest spread evenly.
+A fraction of them (audit_rate) is also scored by the full model so the live
+agreement rate can be reported next to the hit rate.
+
+Usage:
+    python cascade.py fit [--csv engine_data.csv] [--out normal_envelope.json] [--target 0.995]
+    python cascade.py eval [--csv engine_data.csv] [--envelope normal_envelope.json]
+"""
+
+import argparse
+import json
+import threading
+
+import numpy as np
+
+NORMAL_LABEL = "No Issue"
+
+
+class NormalEnvelope:
+    def __init__(self, lo, hi, meta=None):
+        self.lo = np.asarray(lo, dtype=np.float32)
+        self.hi = np.asarray(hi, dtype=np.float32)
+        self.meta = meta or {}
+
+    def contains(self, X):
+        """Boolean mask of rows whose every channel lies inside [lo, hi]."""
+        X = np.asarray(X, dtype=np.float32)
+        return np.all((X >= self.lo) & (X <= self.hi), axis=1)
+
+    @property
+    def agreement(self):
+        """Fraction of in-envelope rows the full model labels "No Issue" (held-out if measured)."""
+        return self.meta.get("agreement", self.meta.get("train_agreement", 1.0))
+
+    @staticmethod
+    def _peel(X, normal, alpha):
+        """Yields (lo, hi) after each peeling step, starting from the box around every row."""
+        lo, hi = X.min(axis=0), X.max(axis=0)
+        inside = np.ones(len(X), dtype=bool)
+        yield lo.copy(), hi.copy()
+        while normal[inside].mean() < 1.0:
+            best = None
+            for c in range(X.shape[1]):
+                values = X[inside, c]
+                for side, q in ((0, alpha), (1, 1.0 - alpha)):
+                    t = np.quantile(values, q)
+                    keep = inside & ((X[:, c] >= t) if side == 0 else (X[:, c] <= t))
+                    if not keep.any() or keep.sum() == inside.sum():
+                        continue
+                    agreement = normal[keep].mean()
+                    if best is None or agreement > best[0]:
+                        best = (agreement, c, side, t, keep)
+            if best is None:
+                return
+            _, c, side, t, inside = best
+            if side == 0:
+                lo[c] = t
+            else:
+                hi[c] = t
+            yield lo.copy(), hi.copy()
+
+    @classmethod
+    def fit(cls, X, labels, target_agreement=0.995, alpha=0.02, holdout=0.2, seed=3, min_holdout_rows=100):
+        """
+        X: (N, 6) readings; labels: full-model labels for X.
+        Peels a box on a (1 - holdout) split of X, moving one edge in by an `alpha` quantile
+        at a time, until at least target_agreement of its rows are "No Issue" on both the
+        training split and the held-out rows (of which at least min_holdout_rows must fall
+        inside). Raises ValueError if no box gets there.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        normal = np.asarray(labels) == NORMAL_LABEL
+        if not normal.any():
+            raise ValueError("The model labels no rows as normal; cannot fit an envelope")
+
+        order = np.random.default_rng(seed).permutation(len(X))
+        n_test = int(round(holdout * len(X)))
+        test, train = order[:n_test], order[n_test:]
+
+        def measure(rows, lo, hi):
+            inside = np.all((X[rows] >= lo) & (X[rows] <= hi), axis=1)
+            hit_rate = float(inside.mean()) if len(rows) else None
+            agreement = float(normal[rows][inside].mean()) if inside.any() else None
+            return hit_rate, agreement, int(inside.sum())
+
+        for lo, hi in cls._peel(X[train], normal[train], alpha):
+            train_hit_rate, train_agreement, _ = measure(train, lo, hi)
+            if train_agreement is None or train_agreement < target_agreement:
+                continue
+            if n_test:
+                hit_rate, agreement, n_inside = measure(test, lo, hi)
+                if n_inside < min_holdout_rows:
+                    break
+                if agreement < target_agreement:
+                    continue
+            else:
+                hit_rate, agreement = train_hit_rate, train_agreement
+            meta = {
+                "target_agreement": float(target_agreement),
+                "peel_alpha": float(alpha),
+                "train_hit_rate": train_hit_rate,
+                "train_agreement": train_agreement,
+                "hit_rate": hit_rate,
+                "agreement": agreement,
+            }
+            return cls(lo, hi, meta)
+        raise ValueError(f"No box reaches {target_agreement:.3%} agreement with the model on held-out rows")
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"lo": self.lo.tolist(), "hi": self.hi.tolist(), "meta": self.meta}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["lo"], data["hi"], data.get("meta"))
+
+
+class FaultCascade:
+    def __init__(self, envelope, score_fn, n_classes, normal_index=0, audit_rate=0.01, seed=0):
+        """
+        envelope: NormalEnvelope for the fast path
+        score_fn: callable((N, 6) float32 array) -> (labels, confidences, all_probs) for the full model
+        audit_rate: fraction of fast-path rows also sent to the full model to track agreement
+        """
+        self.envelope = envelope
+        self.score_fn = score_fn
+        self.n_classes = n_classes
+        self.normal_index = normal_index
+        self.audit_rate = audit_rate
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+        self.rows = 0
+        self.hits = 0
+        self.audited = 0
+        self.audit_agreed = 0
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        inside = self.envelope.contains(X)
+        n = len(X)
+
+        # Fast-path rows: the envelope's measured agreement, not a certain "No Issue"
+        agreement = self.envelope.agreement
+        labels = np.full(n, NORMAL_LABEL, dtype=object)
+        confidences = np.full(n, agreement, dtype=np.float32)
+        probs = np.full((n, self.n_classes), (1.0 - agreement) / max(self.n_classes - 1, 1), dtype=np.float32)
+        probs[:, self.normal_index] = agreement
+
+        # Borderline rows plus a random sample of fast-path rows (for the agreement audit)
+        audit = inside & (self._rng.random(n) < self.audit_rate)
+        send = ~inside | audit
+        if send.any():
+            l, c, p = self.score_fn(X[send])
+            sent_idx = np.flatnonzero(send)
+            slow = ~inside[sent_idx]
+            labels[sent_idx[slow]] = l[slow]
+            confidences[sent_idx[slow]] = c[slow]
+            probs[sent_idx[slow]] = p[slow]
+            audit_agreed = int((l[~slow] == NORMAL_LABEL).sum())
+        else:
+            audit_agreed = 0
+
+        with self._lock:
+            self.rows += n
+            self.hits += int(inside.sum())
+            self.audited += int(audit.sum())
+            self.audit_agreed += audit_agreed
+        return labels.astype(str), confidences, probs
+
+    def evaluate(self, X):
+        """Scores X through both paths; returns hit rate and agreement on fast-path rows."""
+        X = np.asarray(X, dtype=np.float32)
+        inside = self.envelope.contains(X)
+        full_labels, _, _ = self.score_fn(X)
+        agreement = float((full_labels[inside] == NORMAL_LABEL).mean()) if inside.any() else None
+        return {
+            "rows": len(X),
+            "hit_rate": float(inside.mean()) if len(X) else None,
+            "agreement": agreement,
+            "overall_label_agreement": float(np.mean(np.where(inside, NORMAL_LABEL, full_labels) == full_labels)),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "hit_rate": (self.hits / self.rows) if self.rows else None,
+                "audited": self.audited,
+                "audit_agreement": (self.audit_agreed / self.audited) if self.audited else None,
+                "envelope": self.envelope.meta,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit or evaluate the rule-based fast path")
+    parser.add_argument("command", choices=["fit", "eval"])
+    parser.add_argument("--csv", default="engine_data.csv")
+    parser.add_argument("--envelope", "--out", dest="envelope", default="normal_envelope.json")
+    parser.add_argument("--target", type=float, default=0.995, help="fit: required agreement with the model")
+    args = parser.parse_args()
+
+    import run_maintainance
+    from dataset import load_engine_data
+
+    X, _ = load_engine_data(args.csv)
+    X = np.asarray(X, dtype=np.float32)
+    model = run_maintainance.get_model()
+
+    def full(x):
+        return run_maintainance.get_engine_faults(x, model=model)
+
+    if args.command == "fit":
+        labels, _, _ = full(X)
+        envelope = NormalEnvelope.fit(X, labels, target_agreement=args.target)
+        envelope.save(args.envelope)
+        print(f"Saved {args.envelope}: {envelope.meta}")
+    else:
+        envelope = NormalEnvelope.load(args.envelope)
+
+    cascade = FaultCascade(envelope, full, n_classes=len(run_maintainance.CLASS_LABELS))
+    print(cascade.evaluate(X))
@@ -0,0 +1,107 @@
+"""
+Micro-batching for single-reading requests.
+
+Request threads call `RequestCoalescer.score(reading)`; readings are queued and
+a background thread collects them for up to max_wait_ms (or until max_batch
+readings are waiting), scores the whole batch with one call to score_fn, and
+hands each caller its own row of the result.
+
+Queue-depth and batch-size histograms use power-of-two buckets (bucket k counts
+values in (k/2, k]) so the wait/batch settings can be tuned from live traffic.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def _bucket(n):
+    return 1 << max(n - 1, 0).bit_length()
+
+
+class RequestCoalescer:
+    def __init__(self, score_fn, max_wait_ms=2.0, max_batch=64):
+        """
+        score_fn: callable((N, 6) float32 array) -> (labels, confidences, all_probs)
+        max_wait_ms: how long the first reading of a batch may wait for company
+        max_batch: flush as soon as this many readings are queued
+        """
+        self.score_fn = score_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.requests = 0
+        self.batches = 0
+        self.batch_size_hist = {}
+        self.queue_depth_hist = {}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="maint-coalescer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, reading):
+        """Queues one reading; the Future resolves to (label, confidence, all_probs)."""
+        self._ensure_started()
+        future = Future()
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.requests += 1
+            b = _bucket(depth + 1)
+            self.queue_depth_hist[b] = self.queue_depth_hist.get(b, 0) + 1
+        self._queue.put((reading, future))
+        return future
+
+    def score(self, reading, timeout=None):
+        return self.submit(reading).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                self.batches += 1
+                b = _bucket(len(batch))
+                self.batch_size_hist[b] = self.batch_size_hist.get(b, 0) + 1
+
+            try:
+                readings = np.asarray([reading for reading, _ in batch], dtype=np.float32)
+                labels, confidences, probs = self.score_fn(readings)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for i, (_, future) in enumerate(batch):
+                future.set_result((str(labels[i]), confidences[i], probs[i]))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_batch": self.max_batch,
+                "queue_depth": self._queue.qsize(),
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": (self.requests / self.batches) if self.batches else None,
+                "batch_size_hist": dict(sorted(self.batch_size_hist.items())),
+                "queue_depth_hist": dict(sorted(self.queue_depth_hist.items())),
+            }
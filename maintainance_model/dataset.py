@@ -0,0 +1,93 @@
+"""
+Cached binary form of engine CSVs (engine_data.csv, data.csv, fleet logs).
+
+The first load parses the CSV with pandas and writes the six feature columns as
+a float32 (N, 6) .npy matrix plus an int64 label vector, named after a hash of
+the CSV contents. Later loads memory-map those files (np.load(mmap_mode="r")),
+which takes milliseconds and copies nothing. Editing the CSV changes its hash,
+so a stale cache is never read.
+
+A small index file maps the CSV's (size, mtime) to its last known hash so
+unchanged files are not re-hashed on every load.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FEATURES = ['Engine rpm', 'Lub oil pressure', 'Fuel pressure', 'Coolant pressure', 'lub oil temp', 'Coolant temp']
+LABEL = 'Engine Condition'
+
+CACHE_DIRNAME = ".engine_cache"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _content_hash(csv_path, cache_dir):
+    """sha1 of the CSV, reusing the previous hash if size and mtime are unchanged."""
+    st = os.stat(csv_path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    index_path = os.path.join(cache_dir, "index.json")
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    key = os.path.abspath(csv_path)
+    entry = index.get(key)
+    if entry and entry["stamp"] == stamp:
+        return entry["sha1"]
+
+    digest = file_hash(csv_path)
+    index[key] = {"stamp": stamp, "sha1": digest}
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    return digest
+
+
+def _save_atomic(path, arr):
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, arr)
+    os.replace(tmp_path, path)
+
+
+def cache_paths(csv_path, cache_dir=None):
+    """Returns (features_path, labels_path) of the cache for csv_path's current contents."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIRNAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    prefix = os.path.join(cache_dir, f"{stem}-{_content_hash(csv_path, cache_dir)[:16]}")
+    return f"{prefix}.X.npy", f"{prefix}.y.npy"
+
+
+def load_engine_data(csv_path="engine_data.csv", cache_dir=None):
+    """
+    Returns (X, y) for csv_path as read-only memory maps.
+
+    X is float32 (N, 6) in FEATURES order; y is the int64 LABEL column, or None
+    if the CSV has no label column (e.g. unlabeled fleet logs).
+    """
+    x_path, y_path = cache_paths(csv_path, cache_dir)
+    if not os.path.exists(x_path):
+        import pandas as pd
+
+        df = pd.read_csv(csv_path)
+        if LABEL in df.columns:
+            _save_atomic(y_path, np.ascontiguousarray(df[LABEL].values, dtype=np.int64))
+        _save_atomic(x_path, np.ascontiguousarray(df[FEATURES].values, dtype=np.float32))
+
+    X = np.load(x_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r") if os.path.exists(y_path) else None
+    return X, y
@@ -1,7 +1,8 @@
+import argparse
+import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from torch.utils.data import DataLoader, TensorDataset
@@ -15,8 +16,17 @@ class MaintananceNN(nn.Module):
         self.fc3 = nn.Linear(64, 32)
         self.fc4 = nn.Linear(32, 32)
         self.fc5 = nn.Linear(32, 11)
+        # Optional input standardization, set by --fast; buffers so state_dict() and .to() carry them
+        self.register_buffer("feature_mean", None)
+        self.register_buffer("feature_scale", None)
+
+    def set_feature_scaling(self, mean, scale):
+        self.feature_mean = torch.as_tensor(mean, dtype=torch.float32)
+        self.feature_scale = torch.as_tensor(scale, dtype=torch.float32)
 
     def forward(self, x):
+        if self.feature_mean is not None:
+            x = (x - self.feature_mean) / self.feature_scale
         x = self.fc1(x)
         x = self.relu(x)
         x = self.fc2(x)
@@ -29,14 +39,119 @@ class MaintananceNN(nn.Module):
         return x
 
 
-if __name__ == "__main__":
-    df = pd.read_csv('data.csv')
+def load_checkpoint(model, state):
+    """
+    Loads a state_dict into model. A --fast state_dict also holds the feature_mean / feature_scale
+    buffers; older --fast checkpoints ({"state_dict", "feature_mean", "feature_scale"}) are accepted too.
+    """
+    if "state_dict" in state:
+        state = dict(state["state_dict"], feature_mean=state.get("feature_mean"),
+                     feature_scale=state.get("feature_scale"))
+        if state["feature_mean"] is None:
+            del state["feature_mean"], state["feature_scale"]
+    if "feature_mean" in state:
+        # None buffers are not loaded into, so give them a tensor first
+        model.set_feature_scaling(state["feature_mean"], state["feature_scale"])
+    model.load_state_dict(state)
+    return model
 
-    X = df[['Engine rpm', 'Lub oil pressure', 'Fuel pressure', 'Coolant pressure', 'lub oil temp', 'Coolant temp']].values
-    y = df['Engine Condition'].values
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=3)
+def save_checkpoint(model, path):
+    torch.save(model.state_dict(), path)
+
+
+def evaluate(model, X, y):
+    """Accuracy (%) of model on the whole tensor X in one forward pass."""
+    model.eval()
+    with torch.no_grad():
+        predicted = torch.argmax(model(X), dim=1)
+    return 100.0 * (predicted == y).sum().item() / len(y)
+
+
+def train_fast(model, X_train, y_train, X_val, y_val, num_epochs=100, batch_size=256,
+               lr=0.001, eval_every=5, patience=None, seed=0, verbose=True):
+    """
+    Trains model with index-permutation minibatching on preallocated tensors.
+
+    Evaluates on the validation set every eval_every epochs (and on the last epoch)
+    and stops early once validation accuracy has not improved for `patience`
+    evaluations. The best-scoring weights are restored before returning. The
+    validation set must be split off the training data, not the test set, or the
+    final test accuracy is biased by model selection.
+    Returns a list of per-epoch dicts (loss, train_acc, val_acc, samples_per_sec).
+    """
+    X_train = torch.as_tensor(X_train, dtype=torch.float32).contiguous()
+    y_train = torch.as_tensor(y_train, dtype=torch.long).contiguous()
+    X_val = torch.as_tensor(X_val, dtype=torch.float32).contiguous()
+    y_val = torch.as_tensor(y_val, dtype=torch.long).contiguous()
+
+    n = len(X_train)
+    xb_buf = torch.empty((batch_size, X_train.shape[1]), dtype=X_train.dtype)
+    yb_buf = torch.empty((batch_size,), dtype=y_train.dtype)
+    generator = torch.Generator().manual_seed(seed)
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+
+    history = []
+    best_acc, best_state, stale_evals = None, None, 0
+    for epoch in range(num_epochs):
+        model.train()
+        start = time.perf_counter()
+        perm = torch.randperm(n, generator=generator)
+        running_loss = torch.zeros(())
+        correct = torch.zeros((), dtype=torch.long)
+
+        for i in range(0, n, batch_size):
+            idx = perm[i:i + batch_size]
+            inputs = torch.index_select(X_train, 0, idx, out=xb_buf[:len(idx)])
+            labels = torch.index_select(y_train, 0, idx, out=yb_buf[:len(idx)])
+
+            optimizer.zero_grad(set_to_none=True)
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.detach() * len(idx)
+            correct += (torch.argmax(outputs, dim=1) == labels).sum()
+
+        elapsed = time.perf_counter() - start
+        record = {
+            "epoch": epoch + 1,
+            "loss": running_loss.item() / n,
+            "train_acc": 100.0 * correct.item() / n,
+            "val_acc": None,
+            "samples_per_sec": n / elapsed,
+        }
+
+        last_epoch = epoch + 1 == num_epochs
+        if (epoch + 1) % eval_every == 0 or last_epoch:
+            record["val_acc"] = evaluate(model, X_val, y_val)
+            if best_acc is None or record["val_acc"] > best_acc:
+                best_acc = record["val_acc"]
+                best_state = {k: v.clone() for k, v in model.state_dict().items()}
+                stale_evals = 0
+            else:
+                stale_evals += 1
+        history.append(record)
+
+        if verbose:
+            val_str = f", Val Acc: {record['val_acc']:.1f}" if record["val_acc"] is not None else ""
+            print(f"Epoch [{epoch+1}/{num_epochs}], Loss: {record['loss']:.4f}, Train Acc: {record['train_acc']:.1f}"
+                  f"{val_str}, {record['samples_per_sec']:,.0f} samples/s")
+
+        if patience is not None and stale_evals >= patience:
+            if verbose:
+                print(f"Early stopping: no validation improvement in {patience} evaluations")
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    return history
+
 
+def train_legacy(X_train, X_test, y_train, y_test, num_epochs=100):
     X_train_tensor = torch.tensor(X_train, dtype=torch.float32)
     X_test_tensor = torch.tensor(X_test, dtype=torch.float32)
     y_train_tensor = torch.tensor(y_train, dtype=torch.long)
@@ -56,8 +171,6 @@ if __name__ == "__main__":
     # optimizer = optim.SGD(model.parameters(), lr=0.01, momentum=0.9)
     optimizer = optim.Adam(model.parameters(), lr=0.001)
 
-    num_epochs = 100
-
     sm = nn.Softmax()
 
     for epoch in range(num_epochs):
@@ -107,5 +220,45 @@ if __name__ == "__main__":
 
     accuracy = 100 * correct / total
     print(f'Accuracy on test data: {accuracy}%')
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train MaintananceNN")
+    parser.add_argument("--data", required=True,
+                        help="labelled CSV with the 11-class fault label (engine_data.csv only has a binary one)")
+    parser.add_argument("--out", default="model.pt")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--fast", action="store_true",
+                        help="permutation minibatching, periodic vectorized eval, feature scaling, early stopping")
+    parser.add_argument("--batch-size", type=int, default=256, help="--fast only")
+    parser.add_argument("--lr", type=float, default=0.001, help="--fast only")
+    parser.add_argument("--eval-every", type=int, default=5, help="--fast only: epochs between validation evaluations")
+    parser.add_argument("--patience", type=int, default=None, help="--fast only: evaluations without improvement before stopping")
+    args = parser.parse_args()
+
+    from dataset import load_engine_data
+
+    # Memory-mapped float32 features / int64 labels, converted from the CSV on first use
+    X, y = load_engine_data(args.data)
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=3)
+
+    if args.fast:
+        # Early stopping and the best-weights restore select on a validation split of the training data,
+        # so the test split is only used once, for the accuracy reported below
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.1, random_state=3)
+        scaler = StandardScaler().fit(X_fit)
+        model = MaintananceNN()
+        train_fast(model, scaler.transform(X_fit), y_fit, scaler.transform(X_val), y_val,
+                   num_epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+                   eval_every=args.eval_every, patience=args.patience)
+        # Store the scaler in the model so forward() standardizes raw readings at inference time
+        model.set_feature_scaling(scaler.mean_, scaler.scale_)
+        X_test_tensor = torch.tensor(X_test, dtype=torch.float32)
+        y_test_tensor = torch.tensor(y_test, dtype=torch.long)
+        print(f'Accuracy on test data: {evaluate(model, X_test_tensor, y_test_tensor)}%')
+    else:
+        model = train_legacy(X_train, X_test, y_train, y_test, num_epochs=args.epochs)
 
-    torch.save(model.state_dict(), "model.pt")
+    save_checkpoint(model, args.out)
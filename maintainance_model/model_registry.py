@@ -0,0 +1,99 @@
+"""
+Process-wide cache for the maintenance model weights.
+
+The registry loads a checkpoint once, runs a warm-up forward pass, and then
+hands out the same model object to every caller. When the checkpoint file's
+mtime changes, the next caller triggers a reload; the new model is loaded and
+warmed up off to the side and then swapped in with a single reference
+assignment, so in-flight requests keep using the old weights until they finish.
+"""
+
+import os
+import threading
+import time
+
+
+class ModelRegistry:
+    def __init__(self, loader, model_path, warmup=None, check_interval=1.0):
+        """
+        loader: callable(model_path) -> model
+        model_path: checkpoint file to load and watch
+        warmup: optional callable(model) run once before a model is published
+        check_interval: minimum seconds between mtime checks
+        """
+        self.loader = loader
+        self.model_path = model_path
+        self.warmup = warmup
+        self.check_interval = check_interval
+
+        self._model = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+        self.load_count = 0
+        self.last_load_s = None
+        self.last_warmup_s = None
+        self.last_swap_s = None
+        self.last_error = None
+
+    def get(self):
+        """Returns the current model, loading or hot-reloading it if needed."""
+        model = self._model
+        if model is None:
+            return self.reload()
+
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            try:
+                mtime = os.stat(self.model_path).st_mtime_ns
+            except OSError:
+                mtime = self._mtime
+            if mtime != self._mtime:
+                try:
+                    return self.reload()
+                except Exception as e:
+                    # Keep serving the old weights if the new file is unreadable (e.g. half-written)
+                    self.last_error = f"{type(e).__name__}: {e}"
+        return model
+
+    def reload(self, force=False):
+        """Loads the checkpoint, warms it up and atomically swaps it in."""
+        with self._reload_lock:
+            mtime = os.stat(self.model_path).st_mtime_ns
+            if not force and self._model is not None and mtime == self._mtime:
+                # Another thread already reloaded while we waited on the lock
+                return self._model
+
+            t0 = time.perf_counter()
+            model = self.loader(self.model_path)
+            t1 = time.perf_counter()
+            if self.warmup is not None:
+                self.warmup(model)
+            t2 = time.perf_counter()
+
+            self._model = model
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+            t3 = time.perf_counter()
+
+            self.load_count += 1
+            self.last_load_s = t1 - t0
+            self.last_warmup_s = t2 - t1
+            self.last_swap_s = t3 - t2
+            self.last_error = None
+            return model
+
+    def stats(self):
+        """Load/swap timings for health checks and dashboards."""
+        return {
+            "model_path": self.model_path,
+            "loaded": self._model is not None,
+            "mtime_ns": self._mtime,
+            "load_count": self.load_count,
+            "last_load_s": self.last_load_s,
+            "last_warmup_s": self.last_warmup_s,
+            "last_swap_s": self.last_swap_s,
+            "last_error": self.last_error,
+        }
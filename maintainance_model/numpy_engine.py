@@ -0,0 +1,156 @@
+"""
+Torch-free inference for MaintananceNN.
+
+The MLP is five Linear layers with ReLU in between, so serving it only needs
+NumPy matmuls. `export_npz` converts a torch checkpoint into a compact .npz
+(the only step that needs torch); `NumpyMaintananceNN` loads that file and runs
+the forward pass in float32 or float16.
+
+float32 matches the torch model. float16 does not: readings near a decision
+boundary can flip label (about 0.2% of engine_data.csv with the bundled
+checkpoint), so use it only where that is acceptable. Without a feature
+scaler the first layer sees raw readings (rpm in the hundreds), so fc1 is
+kept in float32 either way; only the later layers run in float16.
+
+Usage:
+    python numpy_engine.py export multiclass_model.pt multiclass_model.npz [--float16]
+    python numpy_engine.py verify multiclass_model.npz multiclass_model.pt [--float16]
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+LAYER_NAMES = ["fc1", "fc2", "fc3", "fc4", "fc5"]
+
+
+def softmax(logits):
+    """Row-wise softmax, computed in float32 regardless of the input dtype."""
+    z = logits.astype(np.float32, copy=False)
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+def export_npz(checkpoint_path, out_path, dtype=np.float32):
+    """
+    Writes the Linear weights of a MaintananceNN checkpoint to a compressed .npz.
+
+    Weights are stored pre-transposed as (in_features, out_features) so the
+    forward pass is a plain `x @ W + b`. Checkpoints saved by `model.py --fast`
+    also carry the feature scaler, which is exported alongside the weights.
+    Without a scaler fc1 is stored in float32 whatever dtype is (see the module docstring).
+    """
+    import torch
+
+    try:
+        state = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+    except TypeError:
+        state = torch.load(checkpoint_path, map_location="cpu")
+
+    arrays = {}
+    if "state_dict" in state:
+        # Older --fast checkpoints kept the scaler next to the state_dict
+        state = dict(state["state_dict"], feature_mean=state.get("feature_mean"),
+                     feature_scale=state.get("feature_scale"))
+    if state.get("feature_mean") is not None:
+        arrays["feature_mean"] = state["feature_mean"].numpy().astype(np.float32)
+        arrays["feature_scale"] = state["feature_scale"].numpy().astype(np.float32)
+
+    for i, name in enumerate(LAYER_NAMES):
+        weight = state[f"{name}.weight"].detach().cpu().numpy()
+        bias = state[f"{name}.bias"].detach().cpu().numpy()
+        layer_dtype = np.float32 if i == 0 and "feature_mean" not in arrays else dtype
+        arrays[f"{name}.weight"] = np.ascontiguousarray(weight.T, dtype=layer_dtype)
+        arrays[f"{name}.bias"] = bias.astype(layer_dtype)
+    np.savez_compressed(out_path, **arrays)
+    return out_path
+
+
+class NumpyMaintananceNN:
+    def __init__(self, weights, biases, dtype=np.float32, feature_mean=None, feature_scale=None):
+        self.dtype = np.dtype(dtype)
+        # Standardization is applied in float32 before casting to the compute dtype. Raw
+        # (unscaled) readings are too large for float16 matmuls, so fc1 then stays float32.
+        self.feature_mean = feature_mean
+        self.feature_scale = feature_scale
+        dtypes = [self.dtype] * len(weights)
+        if feature_mean is None:
+            dtypes[0] = np.result_type(self.dtype, np.float32)
+        self.weights = [np.ascontiguousarray(w, dtype=d) for w, d in zip(weights, dtypes)]
+        self.biases = [np.ascontiguousarray(b, dtype=d) for b, d in zip(biases, dtypes)]
+
+    @classmethod
+    def load(cls, npz_path, dtype=np.float32):
+        with np.load(npz_path) as data:
+            weights = [data[f"{name}.weight"] for name in LAYER_NAMES]
+            biases = [data[f"{name}.bias"] for name in LAYER_NAMES]
+            feature_mean = data["feature_mean"] if "feature_mean" in data else None
+            feature_scale = data["feature_scale"] if "feature_scale" in data else None
+        return cls(weights, biases, dtype=dtype, feature_mean=feature_mean, feature_scale=feature_scale)
+
+    def __call__(self, x):
+        """Returns logits for an (N, 6) batch."""
+        h = np.asarray(x, dtype=np.float32)
+        if self.feature_mean is not None:
+            h = (h - self.feature_mean) / self.feature_scale
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            h = h.astype(w.dtype, copy=False) @ w
+            h += b
+            if i != last:
+                np.maximum(h, 0, out=h)
+        return h
+
+    def predict_proba(self, x):
+        return softmax(self(x))
+
+
+def verify(npz_path, checkpoint_path, x, dtype=np.float32):
+    """
+    Compares the NumPy engine against the torch model on a batch of readings.
+    Returns (max_abs_prob_diff, label_agreement).
+    """
+    import torch
+    from model import MaintananceNN, load_checkpoint
+
+    model = MaintananceNN()
+    load_checkpoint(model, torch.load(checkpoint_path, map_location="cpu"))
+    model.eval()
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    with torch.no_grad():
+        ref = torch.softmax(model(torch.from_numpy(x)), dim=1).numpy()
+
+    probs = NumpyMaintananceNN.load(npz_path, dtype=dtype).predict_proba(x)
+    max_diff = float(np.abs(probs - ref).max())
+    agreement = float((probs.argmax(axis=1) == ref.argmax(axis=1)).mean())
+    return max_diff, agreement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="convert a torch checkpoint to .npz")
+    p_export.add_argument("checkpoint")
+    p_export.add_argument("out")
+    p_export.add_argument("--float16", action="store_true", help="store weights as float16")
+
+    p_verify = sub.add_parser("verify", help="compare .npz output against torch")
+    p_verify.add_argument("npz")
+    p_verify.add_argument("checkpoint")
+    p_verify.add_argument("--csv", default="engine_data.csv")
+    p_verify.add_argument("--float16", action="store_true", help="compute in float16")
+
+    args = parser.parse_args()
+    dtype = np.float16 if args.float16 else np.float32
+
+    if args.command == "export":
+        export_npz(args.checkpoint, args.out, dtype=dtype)
+        print(f"Saved {args.out} ({os.path.getsize(args.out)} bytes)")
+    else:
+        x = np.loadtxt(args.csv, delimiter=",", skiprows=1, usecols=range(6), dtype=np.float32)
+        max_diff, agreement = verify(args.npz, args.checkpoint, x, dtype=dtype)
+        print(f"Rows: {len(x)}, max |p_numpy - p_torch|: {max_diff:.2e}, label agreement: {agreement:.4%}")
@@ -1,8 +1,30 @@
-import torch
-from torch.nn import Softmax
-from model import MaintananceNN
+import numpy as np
 import os
 
+# "torch" (default) or "numpy"; the numpy backend serves the exported .npz without importing torch
+BACKEND = os.environ.get("MAINT_BACKEND", "torch").lower()
+
+try:
+    from cascade import FaultCascade, NormalEnvelope
+    from coalescer import RequestCoalescer
+    from dataset import load_engine_data
+    from model_registry import ModelRegistry
+    from numpy_engine import NumpyMaintananceNN
+except ImportError:
+    # Imported as maintainance_model.run_maintainance (e.g. from llm_backbone/server.py)
+    from .cascade import FaultCascade, NormalEnvelope
+    from .coalescer import RequestCoalescer
+    from .dataset import load_engine_data
+    from .model_registry import ModelRegistry
+    from .numpy_engine import NumpyMaintananceNN
+
+if BACKEND != "numpy":
+    import torch
+    try:
+        from model import MaintananceNN, load_checkpoint
+    except ImportError:
+        from .model import MaintananceNN, load_checkpoint
+
 # Define your class labels in the order your model outputs them
 CLASS_LABELS = [
     "No Issue",
@@ -18,45 +40,193 @@ CLASS_LABELS = [
     "Coolant temp abnormal",
 ]
 
+# Input feature order expected by the model (matches the engine_data.csv header)
+FEATURE_COLUMNS = [
+    "Engine rpm",
+    "Lub oil pressure",
+    "Fuel pressure",
+    "Coolant pressure",
+    "lub oil temp",
+    "Coolant temp",
+]
 
-def load_model(model_path="multiclass_model.pt"):
-    model = MaintananceNN()
+_LABELS_ARRAY = np.array(CLASS_LABELS)
+
+
+DEFAULT_MODEL_PATH = "multiclass_model.pt"
+DEFAULT_NUMPY_MODEL_PATH = "multiclass_model.npz"
+
+
+def resolve_model_path(model_path):
     # Resolve path relative to this file's directory if not absolute
     if not os.path.isabs(model_path):
-        here = os.path.dirname(__file__)
+        here = os.path.dirname(os.path.abspath(__file__))
         candidate = os.path.join(here, model_path)
         model_path = candidate if os.path.exists(candidate) else model_path
+    return model_path
+
+
+def load_model(model_path=DEFAULT_MODEL_PATH):
+    if BACKEND == "numpy":
+        raise RuntimeError(
+            "load_model needs torch, which MAINT_BACKEND=numpy does not import; use load_numpy_model instead"
+        )
+    model = MaintananceNN()
+    model_path = resolve_model_path(model_path)
     # Fallback: try loading without weights_only for older torch
     try:
         state = torch.load(model_path, weights_only=True)
     except TypeError:
         state = torch.load(model_path)
-    model.load_state_dict(state)
+    load_checkpoint(model, state)
     model.eval()
     return model
 
 
+def load_numpy_model(model_path=DEFAULT_NUMPY_MODEL_PATH, dtype=None):
+    """
+    Loads weights exported by numpy_engine.py; dtype defaults to $MAINT_NUMPY_DTYPE or float32.
+    float32 gives the same labels as the torch model; float16 flips a few near-tie readings.
+    """
+    if dtype is None:
+        dtype = os.environ.get("MAINT_NUMPY_DTYPE", "float32")
+    return NumpyMaintananceNN.load(resolve_model_path(model_path), dtype=dtype)
+
+
+def _warm_up(model):
+    get_engine_faults(np.zeros((1, len(FEATURE_COLUMNS)), dtype=np.float32), model=model)
+
+
+# Shared by every request in this process; reloads when the checkpoint changes on disk
+if BACKEND == "numpy":
+    registry = ModelRegistry(load_numpy_model, resolve_model_path(DEFAULT_NUMPY_MODEL_PATH), warmup=_warm_up)
+else:
+    registry = ModelRegistry(load_model, resolve_model_path(DEFAULT_MODEL_PATH), warmup=_warm_up)
+
+
+def get_model():
+    return registry.get()
+
+
 def get_engine_fault(engine_stats, model=None):
     """
     Given engine_stats (list or array of 6 floats), returns (label, confidence, all_probs)
     """
-    if model is None:
-        model = load_model()
-    sm = Softmax(dim=0)
-    x = torch.tensor(engine_stats, dtype=torch.float32)
+    labels, confidences, probs = get_engine_faults([engine_stats], model=model)
+    return str(labels[0]), confidences[0], probs[0]
+
+
+def _as_feature_matrix(engine_stats, column_major=False):
+    """
+    Coerces batch input into a contiguous (N, 6) float32 matrix.
+
+    Accepts an (N, 6) array-like, a (6, N) array-like when column_major=True,
+    or a mapping of FEATURE_COLUMNS names to equal-length sequences.
+    """
+    if isinstance(engine_stats, dict):
+        missing = [c for c in FEATURE_COLUMNS if c not in engine_stats]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        x = np.stack(
+            [np.asarray(engine_stats[c], dtype=np.float32) for c in FEATURE_COLUMNS],
+            axis=1,
+        )
+    else:
+        x = np.asarray(engine_stats, dtype=np.float32)
+        if column_major:
+            x = x.T
+    if x.ndim != 2 or x.shape[1] != len(FEATURE_COLUMNS):
+        raise ValueError(
+            f"Expected readings of shape (N, {len(FEATURE_COLUMNS)}), got {x.shape}"
+        )
+    return np.ascontiguousarray(x)
+
+
+def _predict_proba(model, x):
+    if isinstance(model, NumpyMaintananceNN):
+        return model.predict_proba(x)
+    if BACKEND == "numpy":
+        raise TypeError(
+            f"MAINT_BACKEND=numpy only scores NumpyMaintananceNN models, got {type(model).__name__}"
+        )
+    if not x.flags.writeable:
+        # Read-only memory maps from dataset.py; torch.from_numpy needs a writable buffer
+        x = x.copy()
     with torch.no_grad():
-        logits = model(x)
-        probs = sm(logits)
-        probs_np = probs.detach().cpu().numpy()
-        idx = probs.argmax().item()
-        label = CLASS_LABELS[idx]
-        confidence = probs_np[idx]
-    return label, confidence, probs_np
+        return torch.softmax(model(torch.from_numpy(x)), dim=1).numpy()
+
+
+def get_engine_faults(engine_stats, model=None, column_major=False):
+    """
+    Scores N readings in a single forward pass.
+
+    engine_stats may be an (N, 6) matrix, a (6, N) matrix with column_major=True,
+    or a dict mapping FEATURE_COLUMNS to per-reading values.
+    Returns (labels, confidences, all_probs) as arrays of shape (N,), (N,), (N, 11).
+    model may be a torch MaintananceNN or a NumpyMaintananceNN. Without an explicit
+    model, readings go through the rule-based fast path first when it is enabled.
+    """
+    x = _as_feature_matrix(engine_stats, column_major)
+    if model is None:
+        if fast_path is not None:
+            return fast_path(x)
+        model = get_model()
+    return _score(x, model)
+
+
+def _score(x, model):
+    probs_np = _predict_proba(model, x)
+    idx = probs_np.argmax(axis=1)
+    confidences = probs_np[np.arange(len(idx)), idx]
+    return _LABELS_ARRAY[idx], confidences, probs_np
+
+
+# Set MAINT_FAST_PATH to an envelope file from cascade.py (e.g. normal_envelope.json) to answer
+# readings deep inside the normal operating range without running the network
+FAST_PATH_ENVELOPE = os.environ.get("MAINT_FAST_PATH")
+fast_path = (
+    FaultCascade(
+        NormalEnvelope.load(resolve_model_path(FAST_PATH_ENVELOPE)),
+        lambda x: _score(x, get_model()),
+        n_classes=len(CLASS_LABELS),
+        normal_index=CLASS_LABELS.index("No Issue"),
+    )
+    if FAST_PATH_ENVELOPE else None
+)
+
+
+def score_dataset(csv_path, model=None, batch_size=65536):
+    """
+    Scores every row of an engine CSV (engine_data.csv layout, label column optional).
+
+    Rows are read from the memory-mapped cache built by dataset.py and scored in
+    batches of batch_size. Returns (labels, confidences, all_probs) like get_engine_faults.
+    """
+    if model is None:
+        model = get_model()
+    X, _ = load_engine_data(csv_path)
+    labels, confidences, probs = [], [], []
+    for start in range(0, len(X), batch_size):
+        l, c, p = get_engine_faults(X[start:start + batch_size], model=model)
+        labels.append(l)
+        confidences.append(c)
+        probs.append(p)
+    if not labels:
+        return _LABELS_ARRAY[:0], np.empty(0, np.float32), np.empty((0, len(CLASS_LABELS)), np.float32)
+    return np.concatenate(labels), np.concatenate(confidences), np.concatenate(probs)
 
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS  # Import CORS
 
+# Set MAINT_COALESCE_MS > 0 to micro-batch concurrent /calculate requests into one forward pass
+COALESCE_MS = float(os.environ.get("MAINT_COALESCE_MS", "0"))
+COALESCE_MAX_BATCH = int(os.environ.get("MAINT_COALESCE_MAX_BATCH", "64"))
+coalescer = (
+    RequestCoalescer(get_engine_faults, max_wait_ms=COALESCE_MS, max_batch=COALESCE_MAX_BATCH)
+    if COALESCE_MS > 0 else None
+)
+
 app = Flask(__name__)
 
 # Enable CORS for all routes
@@ -77,12 +247,41 @@ def calculate():
     except ValueError:
         return jsonify({"result": 0}), 400
     
-    result, a, b = get_engine_fault(numbers)
+    if coalescer is not None:
+        result, a, b = coalescer.score(numbers)
+    else:
+        result, a, b = get_engine_fault(numbers)
     
     # Return the result as a JSON response
     return jsonify({"result": result})
 
+@app.route('/calculate_batch', methods=['POST'])
+def calculate_batch():
+    # Accepts either a list of 6-number readings or a dict of feature columns
+    data = request.get_json()
+    column_major = request.args.get('layout') == 'columns'
+
+    try:
+        labels, confidences, probs = get_engine_faults(data, column_major=column_major)
+    except (TypeError, ValueError):
+        return jsonify({"results": []}), 400
+
+    return jsonify({
+        "results": labels.tolist(),
+        "confidences": confidences.tolist(),
+        "probabilities": probs.tolist(),
+    })
+
+@app.route('/model_stats', methods=['GET'])
+def model_stats():
+    stats = registry.stats()
+    stats["coalescer"] = coalescer.stats() if coalescer is not None else None
+    stats["fast_path"] = fast_path.stats() if fast_path is not None else None
+    return jsonify(stats)
+
 if __name__ == '__main__':
+    # Load and warm up the weights before the first request arrives
+    get_model()
     app.run(debug=True)
 
     # Example input: Engine rpm, Lub oil pressure, Fuel pressure, Coolant pressure, lub oil temp, Coolant temp
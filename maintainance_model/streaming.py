@@ -0,0 +1,167 @@
+"""
+Streaming, windowed engine-health scoring.
+
+Each vessel gets a fixed-size ring buffer over the six engine channels
+(run_maintainance.FEATURE_COLUMNS). Rolling mean, variance and least-squares
+slope are maintained from running sums, so pushing a sample is O(1) no matter
+how large the window is. The sums are rebuilt exactly once per full lap of the
+ring to keep floating-point drift bounded.
+
+The maintenance model scores the smoothed (rolling mean) vector rather than the
+raw sample, and only when some channel has moved more than `tolerance` since
+that vessel was last scored. Readings from many vessels can be pushed together
+with update_many(), which scores every vessel that needs it in one batch.
+"""
+
+import numpy as np
+
+N_CHANNELS = 6
+
+
+class VesselWindow:
+    def __init__(self, window):
+        self.window = window
+        self.buf = np.zeros((window, N_CHANNELS), dtype=np.float64)
+        self.count = 0
+        self.head = 0  # next slot to overwrite (the oldest sample once full)
+        self.sum_y = np.zeros(N_CHANNELS)
+        self.sum_yy = np.zeros(N_CHANNELS)
+        self.sum_ty = np.zeros(N_CHANNELS)  # sum of t * y with t = 0 for the oldest sample
+
+        self.last_scored = None
+        self.result = None
+
+    def push(self, y):
+        y = np.asarray(y, dtype=np.float64)
+        n = self.window
+        if self.count < n:
+            self.sum_ty += self.count * y
+            self.count += 1
+        else:
+            old = self.buf[self.head]
+            # Every remaining sample's t drops by one; the new sample lands at t = n - 1
+            self.sum_ty -= self.sum_y - old
+            self.sum_ty += (n - 1) * y
+            self.sum_y -= old
+            self.sum_yy -= old * old
+        self.sum_y += y
+        self.sum_yy += y * y
+        self.buf[self.head] = y
+        self.head = (self.head + 1) % n
+        if self.head == 0 and self.count == n:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Only called right after the ring wraps, when buf is in oldest-to-newest order
+        t = np.arange(self.window, dtype=np.float64)
+        self.sum_y = self.buf.sum(axis=0)
+        self.sum_yy = (self.buf * self.buf).sum(axis=0)
+        self.sum_ty = t @ self.buf
+
+    @property
+    def mean(self):
+        return self.sum_y / max(self.count, 1)
+
+    @property
+    def var(self):
+        m = max(self.count, 1)
+        return np.maximum(self.sum_yy / m - self.mean ** 2, 0.0)
+
+    @property
+    def slope(self):
+        """Least-squares trend per sample for each channel (0 until two samples exist)."""
+        m = self.count
+        if m < 2:
+            return np.zeros(N_CHANNELS)
+        sum_t = m * (m - 1) / 2.0
+        sum_tt = (m - 1) * m * (2 * m - 1) / 6.0
+        return (m * self.sum_ty - sum_t * self.sum_y) / (m * sum_tt - sum_t * sum_t)
+
+
+class StreamingEngineScorer:
+    def __init__(self, window=32, tolerance=0.1, channel_scale=None, score_fn=None):
+        """
+        window: samples kept per vessel
+        tolerance: rescore when any channel's rolling mean moves more than
+            tolerance * channel_scale since the last score (scalar or per-channel)
+        channel_scale: per-channel units for tolerance; defaults to the
+            per-channel standard deviation of engine_data.csv
+        score_fn: callable((N, 6) array) -> (labels, confidences, all_probs);
+            defaults to run_maintainance.get_engine_faults
+        """
+        if score_fn is None:
+            from run_maintainance import get_engine_faults as score_fn
+        if channel_scale is None:
+            from dataset import load_engine_data
+
+            X, _ = load_engine_data("engine_data.csv")
+            channel_scale = np.asarray(X, dtype=np.float64).std(axis=0)
+
+        self.window = window
+        self.threshold = np.asarray(tolerance, dtype=np.float64) * np.asarray(channel_scale, dtype=np.float64)
+        self.score_fn = score_fn
+        self.vessels = {}
+
+        self.samples = 0
+        self.scored_rows = 0
+        self.score_calls = 0
+
+    def _window(self, vessel_id):
+        w = self.vessels.get(vessel_id)
+        if w is None:
+            w = self.vessels[vessel_id] = VesselWindow(self.window)
+        return w
+
+    def update(self, vessel_id, reading):
+        """Pushes one reading; returns the vessel's current (label, confidence, all_probs)."""
+        return self.update_many([(vessel_id, reading)])[vessel_id]
+
+    def update_many(self, items):
+        """
+        Pushes (vessel_id, reading) pairs and scores, in one batch, every touched
+        vessel whose smoothed vector moved beyond tolerance.
+        Returns {vessel_id: (label, confidence, all_probs)} for the touched vessels.
+        """
+        touched = {}
+        for vessel_id, reading in items:
+            w = self._window(vessel_id)
+            w.push(reading)
+            touched[vessel_id] = w
+            self.samples += 1
+
+        stale = [
+            (vessel_id, w) for vessel_id, w in touched.items()
+            if w.last_scored is None or np.any(np.abs(w.mean - w.last_scored) > self.threshold)
+        ]
+        if stale:
+            smoothed = np.stack([w.mean for _, w in stale]).astype(np.float32)
+            labels, confidences, probs = self.score_fn(smoothed)
+            for i, (_, w) in enumerate(stale):
+                w.last_scored = smoothed[i].astype(np.float64)
+                w.result = (str(labels[i]), confidences[i], probs[i])
+            self.score_calls += 1
+            self.scored_rows += len(stale)
+
+        return {vessel_id: w.result for vessel_id, w in touched.items()}
+
+    def state(self, vessel_id):
+        """Rolling statistics and the latest diagnosis for one vessel."""
+        w = self.vessels[vessel_id]
+        label, confidence, _ = w.result if w.result is not None else (None, None, None)
+        return {
+            "samples": w.count,
+            "mean": w.mean.tolist(),
+            "var": w.var.tolist(),
+            "slope": w.slope.tolist(),
+            "diagnosis": label,
+            "confidence": None if confidence is None else float(confidence),
+        }
+
+    def stats(self):
+        return {
+            "vessels": len(self.vessels),
+            "samples": self.samples,
+            "scored_rows": self.scored_rows,
+            "score_calls": self.score_calls,
+            "score_rate": (self.scored_rows / self.samples) if self.samples else None,
+        }
@@ -0,0 +1,206 @@
+"""
+Parallel hyperparameter / model-family sweep for the maintenance classifiers.
+
+Expands a grid of sklearn baselines (the ones explored in data.py) and MLP
+hyperparameters (width, depth, learning rate, batch size, epochs), then fans the
+runs out across a process pool. The CSV is converted once into the binary
+cache from dataset.py; every worker memory-maps the same files, so the pages
+are shared through the OS page cache instead of copied. Each worker is
+capped at --threads-per-worker BLAS/torch threads so the pool does not
+oversubscribe the machine.
+
+Usage:
+    python sweep.py --csv engine_data.csv --out sweep_results.csv [--grid grid.json] [--workers 8]
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from dataset import FEATURES, cache_paths, load_engine_data
+
+DEFAULT_GRID = {
+    "logreg": {"C": [0.1, 1.0, 10.0]},
+    "knn": {"n_neighbors": [3, 5, 11, 21]},
+    "gnb": {},
+    "mlp": {
+        "width": [32, 64, 128],
+        "depth": [2, 4],
+        "lr": [0.001, 0.003],
+        "batch_size": [128, 512],
+        "epochs": [30],
+    },
+}
+
+RESULT_FIELDS = ["family", "params", "accuracy", "train_time_s", "infer_us_per_sample", "error"]
+
+# Per-worker memory maps of the cached dataset and thread cap, set by _init_worker
+_X = None
+_y = None
+_threads = None
+
+
+def expand_grid(grid):
+    """Yields (family, params) for every combination in a {family: {param: [values]}} grid."""
+    for family, space in grid.items():
+        keys = sorted(space)
+        for values in itertools.product(*(space[k] for k in keys)):
+            yield family, dict(zip(keys, values))
+
+
+def _init_worker(x_path, y_path, threads):
+    global _X, _y, _threads
+    import torch
+
+    # numpy (and its BLAS pool) is already loaded here, so *_NUM_THREADS would come too late
+    torch.set_num_threads(threads)
+    _threads = threads
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+
+
+def _make_mlp(width, depth, n_classes):
+    import torch.nn as nn
+
+    layers = [nn.Linear(len(FEATURES), width), nn.ReLU()]
+    for _ in range(depth - 1):
+        layers += [nn.Linear(width, width), nn.ReLU()]
+    layers.append(nn.Linear(width, n_classes))
+    return nn.Sequential(*layers)
+
+
+def _run_sklearn(family, params, X_train, X_test, y_train, y_test):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if family == "logreg":
+        clf = LogisticRegression(solver='liblinear', **params)
+    elif family == "knn":
+        # Scale features (important for KNN)
+        clf = make_pipeline(StandardScaler(), KNeighborsClassifier(**params))
+    elif family == "gnb":
+        clf = GaussianNB(**params)
+    else:
+        raise ValueError(f"Unknown model family: {family}")
+
+    t0 = time.perf_counter()
+    clf.fit(X_train, y_train)
+    t1 = time.perf_counter()
+    y_pred = clf.predict(X_test)
+    t2 = time.perf_counter()
+    return 100.0 * float((y_pred == y_test).mean()), t1 - t0, t2 - t1
+
+
+def _run_mlp(params, X_train, X_test, y_train, y_test):
+    import torch
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.model_selection import train_test_split
+    from model import evaluate, train_fast
+
+    n_classes = int(max(y_train.max(), y_test.max())) + 1
+    # Early stopping selects on a validation split of the training data, as in model.py --fast,
+    # so the reported accuracy is measured on a test split the run never saw
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.1, random_state=3)
+    scaler = StandardScaler().fit(X_fit)
+    X_fit = scaler.transform(X_fit).astype(np.float32)
+    X_val = scaler.transform(X_val).astype(np.float32)
+    X_test = torch.from_numpy(scaler.transform(X_test).astype(np.float32))
+    y_test = torch.from_numpy(y_test)
+
+    torch.manual_seed(0)
+    model = _make_mlp(params["width"], params["depth"], n_classes)
+    t0 = time.perf_counter()
+    train_fast(model, X_fit, y_fit, X_val, y_val, num_epochs=params.get("epochs", 30),
+               batch_size=params["batch_size"], lr=params["lr"],
+               eval_every=params.get("eval_every", 5), patience=params.get("patience"), verbose=False)
+    t1 = time.perf_counter()
+    accuracy = evaluate(model, X_test, y_test)
+    t2 = time.perf_counter()
+    return accuracy, t1 - t0, t2 - t1
+
+
+def run_one(family, params):
+    from sklearn.model_selection import train_test_split
+
+    # Same split as model.py so MLP numbers are comparable with the shipped model
+    X_train, X_test, y_train, y_test = train_test_split(_X, _y, test_size=0.2, random_state=3)
+    result = {"family": family, "params": json.dumps(params, sort_keys=True), "error": ""}
+    try:
+        # Per run, so it also caps BLAS / OpenMP libraries that sklearn loads lazily
+        with threadpool_limits(limits=_threads):
+            if family == "mlp":
+                accuracy, train_s, infer_s = _run_mlp(params, X_train, X_test, y_train, y_test)
+            else:
+                accuracy, train_s, infer_s = _run_sklearn(family, params, X_train, X_test, y_train, y_test)
+        result.update(
+            accuracy=round(accuracy, 3),
+            train_time_s=round(train_s, 4),
+            infer_us_per_sample=round(1e6 * infer_s / len(X_test), 4),
+        )
+    except Exception as e:
+        result.update(accuracy=None, train_time_s=None, infer_us_per_sample=None,
+                      error=f"{type(e).__name__}: {e}")
+    return result
+
+
+def run_sweep(csv_path, grid, workers=None, threads_per_worker=1, out_path=None):
+    """Runs every grid point in a process pool and returns results sorted by accuracy."""
+    workers = workers or os.cpu_count() or 1
+    _, y = load_engine_data(csv_path)
+    if y is None:
+        raise ValueError(f"{csv_path} has no label column to evaluate against")
+    x_path, y_path = cache_paths(csv_path)
+    jobs = list(expand_grid(grid))
+
+    results = []
+    # spawn: torch is not fork-safe once its thread pools exist
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(x_path, y_path, threads_per_worker)) as pool:
+        futures = [pool.submit(run_one, family, params) for family, params in jobs]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            print(f"[{i}/{len(jobs)}] {result['family']} {result['params']} "
+                  f"acc={result['accuracy']} train={result['train_time_s']}s {result['error']}")
+
+    results.sort(key=lambda r: (r["accuracy"] is None, -(r["accuracy"] or 0.0)))
+    if out_path:
+        with open(out_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel sweep over maintenance model families")
+    parser.add_argument("--csv", default="engine_data.csv")
+    parser.add_argument("--grid", default=None, help="JSON file of {family: {param: [values]}}")
+    parser.add_argument("--out", default="sweep_results.csv")
+    parser.add_argument("--workers", type=int, default=None, help="default: all cores")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    t0 = time.perf_counter()
+    results = run_sweep(args.csv, grid, workers=args.workers,
+                        threads_per_worker=args.threads_per_worker, out_path=args.out)
+    print(f"\n{len(results)} runs in {time.perf_counter() - t0:.1f}s, results written to {args.out}")
+    for r in results[:5]:
+        print(f"  {r['accuracy']}%  {r['family']} {r['params']}")
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from model import MaintananceNN, save_checkpoint
+from numpy_engine import NumpyMaintananceNN, export_npz, verify
+
+
+def _readings(n=512, seed=0):
+    rng = np.random.default_rng(seed)
+    # Roughly the scale of engine_data.csv: rpm in the hundreds, pressures and temperatures in the units-tens
+    scale = np.array([800.0, 3.0, 6.0, 2.0, 77.0, 78.0], dtype=np.float32)
+    return (scale * (1 + 0.3 * rng.standard_normal((n, 6)))).astype(np.float32)
+
+
+@pytest.mark.parametrize("scaled", [False, True])
+def test_verify_matches_torch(tmp_path, scaled):
+    torch.manual_seed(0)
+    model = MaintananceNN()
+    x = _readings()
+    if scaled:
+        model.set_feature_scaling(x.mean(axis=0), x.std(axis=0))
+    checkpoint = str(tmp_path / "model.pt")
+    save_checkpoint(model, checkpoint)
+    npz = export_npz(checkpoint, str(tmp_path / "model.npz"))
+
+    max_diff, agreement = verify(npz, checkpoint, x)
+    assert max_diff < 1e-5
+    assert agreement == 1.0
+
+    engine = NumpyMaintananceNN.load(npz)
+    assert (engine.feature_mean is not None) == scaled
+
+
+def test_float16_agrees_on_labels(tmp_path):
+    torch.manual_seed(1)
+    checkpoint = str(tmp_path / "model.pt")
+    save_checkpoint(MaintananceNN(), checkpoint)
+    npz = export_npz(checkpoint, str(tmp_path / "model16.npz"), dtype=np.float16)
+
+    max_diff, agreement = verify(npz, checkpoint, _readings(seed=2), dtype=np.float16)
+    assert max_diff < 1e-2
+    assert agreement > 0.99
+
+    # Unscaled readings are too large for a float16 first layer
+    engine = NumpyMaintananceNN.load(npz, dtype=np.float16)
+    assert engine.weights[0].dtype == np.float32
+    assert all(w.dtype == np.float16 for w in engine.weights[1:])
+
+
+def test_float16_keeps_fc1_float32_on_the_bundled_checkpoint():
+    here = os.path.join(os.path.dirname(__file__), "..")
+    x = np.loadtxt(os.path.join(here, "engine_data.csv"), delimiter=",", skiprows=1, usecols=range(6),
+                   dtype=np.float32)
+    npz, checkpoint = os.path.join(here, "multiclass_model.npz"), os.path.join(here, "multiclass_model.pt")
+
+    max_diff, agreement = verify(npz, checkpoint, x)
+    assert max_diff < 1e-5 and agreement == 1.0
+    # float16 is documented as not label-exact; keep it close
+    max_diff, agreement = verify(npz, checkpoint, x, dtype=np.float16)
+    assert max_diff < 2e-2 and agreement > 0.997
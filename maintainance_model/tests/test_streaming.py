@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from streaming import N_CHANNELS, StreamingEngineScorer, VesselWindow
+
+
+def _naive(samples):
+    y = np.asarray(samples, dtype=np.float64)
+    t = np.arange(len(y), dtype=np.float64)
+    slope = np.polyfit(t, y, 1)[0] if len(y) >= 2 else np.zeros(N_CHANNELS)
+    return y.mean(axis=0), y.var(axis=0), slope
+
+
+@pytest.mark.parametrize("window", [1, 2, 7, 16])
+def test_vessel_window_matches_naive_recompute(window):
+    rng = np.random.default_rng(window)
+    w = VesselWindow(window)
+    seen = []
+    for i in range(5 * window + 3):
+        # Large offset plus a trend, so cancellation errors in the running sums would show
+        y = 1000.0 + 0.5 * i + rng.standard_normal(N_CHANNELS)
+        w.push(y)
+        seen.append(y)
+        mean, var, slope = _naive(seen[-window:])
+        np.testing.assert_allclose(w.mean, mean, rtol=1e-9)
+        np.testing.assert_allclose(w.var, var, rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(w.slope, slope, rtol=1e-6, atol=1e-6)
+        assert w.count == min(i + 1, window)
+
+
+def test_scorer_only_rescores_moved_vessels():
+    calls = []
+
+    def score_fn(x):
+        calls.append(len(x))
+        n = len(x)
+        return np.array(["No Issue"] * n), np.ones(n, np.float32), np.ones((n, 11), np.float32) / 11
+
+    scorer = StreamingEngineScorer(window=4, tolerance=0.5, channel_scale=np.ones(N_CHANNELS), score_fn=score_fn)
+    steady = np.full(N_CHANNELS, 10.0)
+    scorer.update_many([("a", steady), ("b", steady)])
+    assert calls == [2]
+
+    scorer.update_many([("a", steady), ("b", steady + 8.0)])
+    # Only b's rolling mean moved (by 8 / 2 = 4 > 0.5)
+    assert calls == [2, 1]
+    assert scorer.stats()["scored_rows"] == 3
+    assert scorer.state("b")["samples"] == 2